@@ -1,14 +1,13 @@
+import asyncio
 import os
-import json
 from typing import Dict, Any, Optional, List
-from openai import OpenAI
+from openai import AsyncOpenAI
 from sqlalchemy.orm import Session
 from datetime import datetime
-import re
 from pydantic import BaseModel
 
-from .models import UserPreferences, TripParticipant, User, Trip
-from .schemas import UserPreferencesCreate
+from .models import UserPreferences, TripParticipant
+from .cache import TTLCache, load_trip
 
 # Pydantic models for structured outputs
 class IntentAnalysis(BaseModel):
@@ -26,9 +25,15 @@ class ExtractedPreferences(BaseModel):
     dietary_restrictions: Optional[str] = None
     special_requirements: Optional[str] = None
 
+# The same phrases ("next summer", "in September") recur across users and
+# trips. Relative dates are resolved against the current month, so it is part
+# of the key.
+INTENT_CACHE_TTL = 24 * 3600
+_intent_cache = TTLCache(maxsize=1024)
+
 class AIAgent:
     def __init__(self):
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        self.client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
         
     async def analyze_message(self, message: str, trip_id: str, user_id: int, db: Session) -> Dict[str, Any]:
         """
@@ -45,8 +50,12 @@ class AIAgent:
         }
         """
         
-        # First, detect intent using GPT-4o
-        intent_analysis = await self._detect_intent(message)
+        # Detect intent and extract preferences at the same time; the three
+        # completions are independent of each other
+        intent_analysis, preferences, has_any_preferences = await asyncio.gather(
+            self._detect_intent(message),
+            self._extract_preferences(message),
+            self._has_preferences_content(message))
         
         result = {
             "intent": intent_analysis.intent,
@@ -67,10 +76,7 @@ class AIAgent:
             # Flag start planning intent so the caller can kick off itinerary generation
             result["start_planning"] = True
             
-        # Extract preferences regardless of intent
-        preferences = await self._extract_preferences(message)
-        has_any_preferences = await self._has_preferences_content(message)
-        
+        # Preferences are extracted regardless of intent
         if preferences:
             # Convert Pydantic model to dict, excluding None values
             preferences_dict = {k: v for k, v in preferences.model_dump().items() if v is not None}
@@ -88,9 +94,14 @@ class AIAgent:
     async def _detect_intent(self, message: str) -> IntentAnalysis:
         """Detect the intent of the user message"""
         
+        current_date = datetime.now()
+        cache_key = (" ".join(message.lower().split()), current_date.strftime("%Y-%m"))
+        cached = _intent_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            current_date = datetime.now()
-            response = self.client.beta.chat.completions.parse(
+            response = await self.client.beta.chat.completions.parse(
                 model="gpt-4o",
                 messages=[
                     {
@@ -137,7 +148,9 @@ Examples:
                 max_tokens=300
             )
             
-            return response.choices[0].message.parsed
+            intent = response.choices[0].message.parsed
+            _intent_cache.set(cache_key, intent, INTENT_CACHE_TTL)
+            return intent
             
         except Exception as e:
             print(f"Error detecting intent: {e}")
@@ -147,7 +160,7 @@ Examples:
         """Generate a calendar-focused response when dates are mentioned"""
         
         # Get trip information
-        trip = db.query(Trip).filter(Trip.trip_id == trip_id).first()
+        trip = load_trip(db, trip_id)
         participants = db.query(TripParticipant).filter(TripParticipant.trip_id == trip_id).all()
         
         trip_info = {
@@ -157,7 +170,7 @@ Examples:
         }
         
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model="gpt-4o",
                 messages=[
                     {
@@ -199,7 +212,7 @@ Example responses:
         """Extract travel preferences from the message"""
         
         try:
-            response = self.client.beta.chat.completions.parse(
+            response = await self.client.beta.chat.completions.parse(
                 model="gpt-4o",
                 messages=[
                     {
@@ -298,7 +311,7 @@ Examples:
         """Check if a message contains any preference-related content"""
         
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {
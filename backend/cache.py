@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from sqlalchemy.orm import Session
+
+from .models import Trip
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after a per-entry TTL.
+
+    Not thread-safe; meant for state owned by the event loop.
+    """
+
+    def __init__(self, maxsize: int = 10_000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def load_trip(db: Session, trip_id: str) -> Optional[Trip]:
+    """Trip by public id, memoized on the session.
+
+    One request's session is shared by the handler, the agent and the
+    planners, which all look up the same trip; only the first call queries.
+    Misses are not memoized so a trip created later in the session is found.
+    """
+    trips = db.info.setdefault("trips", {})
+    trip = trips.get(trip_id)
+    if trip is None:
+        trip = db.query(Trip).filter(Trip.trip_id == trip_id).first()
+        if trip is not None:
+            trips[trip_id] = trip
+    return trip
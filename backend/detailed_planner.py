@@ -1,18 +1,34 @@
-import json
 import os
 from datetime import datetime, timedelta
 import httpx
 from sqlalchemy.orm import Session
 
-from .models import Message, Trip, UserPreferences, TripParticipant, User
+from .models import Message, UserPreferences, TripParticipant, User
+from .cache import load_trip
+from .retry import RATE_LIMIT_STATUSES, post_with_retry
 
 # Base URL for external Trip Planner API
 EXTERNAL_API_BASE_URL = os.getenv("EXTERNAL_API_BASE_URL", "http://localhost:8001")
 
 
+def create_planner_client() -> httpx.AsyncClient:
+    """Client for the Trip Planner API, one per app (see main.lifespan).
+
+    Keeps connections alive between trips instead of a new pool and
+    handshake per call.
+    """
+    return httpx.AsyncClient(
+        timeout=200.0,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32))
+
+
 async def generate_detailed_trip_plan(trip_id: str, winning_option: dict,
-                                      db: Session, manager):
-    """Generate detailed trip plan using external Trip Planner API."""
+                                      db: Session, manager,
+                                      client: httpx.AsyncClient):
+    """Generate detailed trip plan using external Trip Planner API.
+
+    `client` is the app's planner client; tests inject their own.
+    """
     try:
         print(f"DEBUG: Generating detailed trip plan for trip {trip_id}")
         
@@ -45,39 +61,32 @@ async def generate_detailed_trip_plan(trip_id: str, winning_option: dict,
             }
         )
         
-        # Store pending message ID for later deletion
-        pending_message_id = pending_message.id
 
         # ---------------------------------------------------------------
         # Remove any existing prompts asking to generate detailed plan
         # ---------------------------------------------------------------
 
-        prompt_messages = db.query(Message).filter(
+        prompt_ids = [row.id for row in db.query(Message.id).filter(
             Message.trip_id == trip_id,
             Message.type == "agent",
-            Message.meta_data.isnot(None)
-        ).all()
-
-        for msg in prompt_messages:
-            if isinstance(msg.meta_data, dict) and msg.meta_data.get("type") == "detailed_plan_prompt":
-                prompt_id = msg.id
-                db.delete(msg)
-                db.commit()
-
-                # Broadcast deletion so clients remove button prompt
-                await manager.broadcast_to_trip(
-                    trip_id,
-                    {
-                        "type": "message_deleted",
-                        "message_id": prompt_id,
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
-                )
+            Message.meta_data["type"].as_string() == "detailed_plan_prompt"
+        )]
+        if prompt_ids:
+            # One DELETE; the prompt rows were never loaded into the session
+            db.query(Message).filter(Message.id.in_(prompt_ids)).delete(synchronize_session=False)
+            db.commit()
+
+        # Broadcast deletion so clients remove button prompt
+        await manager.broadcast_many(trip_id, [{
+            "type": "message_deleted",
+            "message_id": prompt_id,
+            "timestamp": datetime.utcnow().isoformat()
+        } for prompt_id in prompt_ids])
         
         print(f"DEBUG: Starting detailed plan generation for trip {trip_id}")
         
         # Get trip details
-        trip = db.query(Trip).filter(Trip.trip_id == trip_id).first()
+        trip = load_trip(db, trip_id)
         if not trip:
             return
 
@@ -123,11 +132,14 @@ async def generate_detailed_trip_plan(trip_id: str, winning_option: dict,
         print(payload)
 
         try:
-            async with httpx.AsyncClient(timeout=200.0) as client:
-                api_response = await client.post(f"{EXTERNAL_API_BASE_URL}/plan_itinerary", json=payload)
-                print(api_response.json())
-                # api_response.raise_for_status()
-                api_data = api_response.json()
+            # A multi-minute generation: a gateway 5xx may still have run it, so
+            # only rate limits and connect failures are retried
+            api_response = await post_with_retry(
+                client, f"{EXTERNAL_API_BASE_URL}/plan_itinerary",
+                retry_statuses=RATE_LIMIT_STATUSES, json=payload)
+            print(api_response.json())
+            # api_response.raise_for_status()
+            api_data = api_response.json()
         except Exception as e:
             raise e
             print(f"Error calling external Trip Planner API: {e}")
@@ -142,20 +154,20 @@ async def generate_detailed_trip_plan(trip_id: str, winning_option: dict,
             summary_lines.append(f"• {cp.get('city')}: {len(cp.get('day_plans', []))} days")
         summary_text = "\n".join(summary_lines)
 
-        # Save as message
-        db_message = Message(
-            trip_id=trip_id,
-            user_id=None,  # System message
-            type="detailed_plan",
-            content=f"🎉 **{name}**\n\n{summary_text}",
-            meta_data=detailed_plan)
-        db.add(db_message)
+        # Turn the pending message into the plan message, unless a trip reset
+        # deleted it meanwhile
+        db_message = db.get(Message, pending_message.id, populate_existing=True)
+        if db_message is None:
+            print(f"DEBUG: Pending message of trip {trip_id} is gone, dropping its detailed plan")
+            return
+        db_message.type = "detailed_plan"
+        db_message.content = f"🎉 **{name}**\n\n{summary_text}"
+        db_message.meta_data = detailed_plan
 
         # Update trip state
         trip.state = "DETAILED_PLAN_READY"
         db.commit()
 
-        # Refresh the message to get the ID
         db.refresh(db_message)
 
         # Create message dict manually to ensure proper serialization
@@ -178,36 +190,23 @@ async def generate_detailed_trip_plan(trip_id: str, winning_option: dict,
         # except BlockingIOError:
         #     pass
 
-        # Delete the pending message now that we have the real result
-        db.query(Message).filter(Message.id == pending_message_id).delete()
-        db.commit()
-
-        # Broadcast pending message deletion
         await manager.broadcast_to_trip(
             trip_id, {
-                "type": "message_deleted",
-                "message_id": pending_message_id,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
-
-        # Broadcast the new plan
-        await manager.broadcast_to_trip(
-            trip_id, {
-                "type": "new_message",
+                "type": "message_updated",
                 "message": message_dict,
                 "timestamp": datetime.utcnow().isoformat()
             })
 
         # Automatically fetch hotels and flights once the detailed itinerary is ready
-        await generate_hotels_and_flights(trip_id, detailed_plan, db, manager)
+        await generate_hotels_and_flights(trip_id, detailed_plan, db, manager, client)
 
     except Exception as e:
         raise e
         print(f"Error generating detailed plan: {e}")
         # TODO: Add proper error handling and user notification 
 
-async def generate_hotels_and_flights(trip_id: str, itinerary: dict, db: Session, manager):
+async def generate_hotels_and_flights(trip_id: str, itinerary: dict, db: Session, manager,
+                                      client: httpx.AsyncClient):
     """Fetch hotels and flights for the generated itinerary using the external Trip Planner API."""
     try:
         # Create and broadcast a pending status message
@@ -239,23 +238,23 @@ async def generate_hotels_and_flights(trip_id: str, itinerary: dict, db: Session
             },
         )
 
-        # Determine the departure city (fallback to a sensible default)
-        departure_city: str | None = None
-        participants = db.query(TripParticipant).filter(TripParticipant.trip_id == trip_id).all()
-        for participant in participants:
-            user = db.query(User).filter(User.id == participant.user_id).first()
-            if user and user.home_city:
-                departure_city = user.home_city
-                break
+        # Determine the departure city: home city of the first participant that
+        # has one, in one query instead of one per participant
+        departure_city: str | None = db.query(User.home_city).join(
+            TripParticipant, TripParticipant.user_id == User.id).filter(
+            TripParticipant.trip_id == trip_id,
+            User.home_city.isnot(None),
+            User.home_city != "").order_by(TripParticipant.id).limit(1).scalar()
 
         if not departure_city:
             departure_city = "Paris"  # Default if no home city is set
 
         payload = {"itinerary": itinerary, "departure_city": departure_city}
 
-        async with httpx.AsyncClient(timeout=200.0) as client:
-            api_resp = await client.post(f"{EXTERNAL_API_BASE_URL}/get_hotels_and_flights", json=payload)
-            api_data = api_resp.json()
+        api_resp = await post_with_retry(
+            client, f"{EXTERNAL_API_BASE_URL}/get_hotels_and_flights",
+            retry_statuses=RATE_LIMIT_STATUSES, json=payload)
+        api_data = api_resp.json()
 
         hotels_plan = api_data.get("hotels_plan", {})
         flights_plan = api_data.get("flights_plan", {})
@@ -279,42 +278,27 @@ async def generate_hotels_and_flights(trip_id: str, itinerary: dict, db: Session
             summary_parts.append(f"🏨 {hotels_total} hotel option(s) found")
         summary_text = "\n".join(summary_parts) if summary_parts else "No flights or hotels found."
 
-        # Persist and broadcast the final message
-        final_msg = Message(
-            trip_id=trip_id,
-            user_id=None,
-            type="agent",
-            content=f"📑 **Travel Logistics**\n\n{summary_text}",
-            meta_data={"type": "hotels_flights_plan", "data": api_data},
-        )
-        db.add(final_msg)
+        # Turn the pending message into the final message and broadcast it,
+        # unless a trip reset deleted it meanwhile
+        final_msg = db.get(Message, pending_msg.id, populate_existing=True)
+        if final_msg is None:
+            print(f"DEBUG: Pending message of trip {trip_id} is gone, dropping its hotels and flights")
+            return
+        final_msg.content = f"📑 **Travel Logistics**\n\n{summary_text}"
+        final_msg.meta_data = {"type": "hotels_flights_plan", "data": api_data}
 
         # Update trip state
-        trip = db.query(Trip).filter(Trip.trip_id == trip_id).first()
+        trip = load_trip(db, trip_id)
         if trip:
             trip.state = "HOTELS_FLIGHTS_READY"
 
         db.commit()
         db.refresh(final_msg)
 
-        # Delete pending message
-        db.query(Message).filter(Message.id == pending_msg.id).delete()
-        db.commit()
-
-        # Broadcast deletion and new message
         await manager.broadcast_to_trip(
             trip_id,
             {
-                "type": "message_deleted",
-                "message_id": pending_msg.id,
-                "timestamp": datetime.utcnow().isoformat(),
-            },
-        )
-
-        await manager.broadcast_to_trip(
-            trip_id,
-            {
-                "type": "new_message",
+                "type": "message_updated",
                 "message": {
                     "id": final_msg.id,
                     "trip_id": final_msg.trip_id,
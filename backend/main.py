@@ -1,32 +1,65 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, Response
-from sqlalchemy.orm import Session
-from typing import Dict, Set, Optional
-import json
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.orm import Session, joinedload
+from typing import Any, Dict, Set, Optional, Tuple, NamedTuple
+import orjson
 import asyncio
 from datetime import datetime
 import os
 from pathlib import Path
-from sqlalchemy import cast, String
+from sqlalchemy import Date, func, update, literal_column, distinct, case, exists, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import secrets
 import httpx
+from pydantic import TypeAdapter
+from contextlib import asynccontextmanager
 
-from .database import get_db, engine, retry_db_operation
-from .models import Base, User, Trip, TripParticipant, Message, Vote, DateAvailability, UserPreferences
-from . import schemas
+from .database import get_db, engine, init_db, retry_db_operation, pool_status
+from .models import User, Trip, TripParticipant, Message, Vote, DateAvailability, UserPreferences
+from . import schemas, query_log
+from .cache import TTLCache, load_trip
 from .ai_agent import AIAgent
-from .trip_planner import generate_trip_options_internal
-from .detailed_planner import generate_detailed_trip_plan
+from .trip_planner import generate_trip_options_internal, ImageClient, IMAGE_DIR
+from .detailed_planner import generate_detailed_trip_plan, create_planner_client
 
 # Initialize AI Agent
 ai_agent = AIAgent()
 
 # Create all tables
-Base.metadata.create_all(bind=engine)
+init_db()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP client for all outbound calls (geocoding, Vite proxy)
+    app.state.http = httpx.AsyncClient(
+        timeout=httpx.Timeout(5.0, connect=2.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50))
+    # getimg.ai client for the option images
+    app.state.images = ImageClient.create()
+    # Trip Planner API client for the detailed plan and hotels/flights
+    app.state.planner = create_planner_client()
+    yield
+    await app.state.http.aclose()
+    await app.state.images.aclose()
+    await app.state.planner.aclose()
+
+
+class OrjsonResponse(Response):
+    """JSON response encoded with orjson.
+
+    orjson encodes the dict/model responses (chat logs, meta_data blobs) much
+    faster than the stdlib json encoder.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+app = FastAPI(default_response_class=OrjsonResponse, lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -35,8 +68,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Per-request query counts and N+1 warnings while developing
+if os.getenv("NODE_ENV") == "development":
+    query_log.install(engine)
+    app.add_middleware(query_log.QueryLogMiddleware)
+
 
 # WebSocket connection manager
 class ConnectionManager:
@@ -65,21 +104,53 @@ class ConnectionManager:
                 f"DEBUG: Broadcasting to {connection_count} connections for trip {trip_id}: {message.get('type', 'unknown')}"
             )
 
-            for connection in self.active_connections[trip_id]:
-                if connection != exclude:
-                    try:
-                        await connection.send_json(message)
-                    except Exception as e:
-                        print(
-                            f"DEBUG: Failed to send message to connection: {e}"
-                        )
-                        pass
+            # Serialize once and send the same text to every connection
+            # concurrently. Text frames, since the client JSON.parses
+            # event.data as a string.
+            data = orjson.dumps(message).decode()
+            targets = [
+                connection for connection in self.active_connections[trip_id]
+                if connection != exclude
+            ]
+            results = await asyncio.gather(
+                *(connection.send_text(data) for connection in targets),
+                return_exceptions=True)
+
+            # Drop connections that could not be written to
+            for connection, result in zip(targets, results):
+                if isinstance(result, Exception):
+                    print(f"DEBUG: Failed to send message to connection: {result}")
+                    self.disconnect(connection, trip_id)
         else:
             print(f"DEBUG: No active connections for trip {trip_id}")
 
+    async def broadcast_many(self,
+                             trip_id: str,
+                             events: list[dict],
+                             exclude: WebSocket = None):
+        """Send several events to a trip in one ``multi`` frame."""
+        if len(events) == 1:
+            await self.broadcast_to_trip(trip_id, events[0], exclude)
+        elif events:
+            await self.broadcast_to_trip(trip_id, {
+                "type": "multi",
+                "events": events
+            }, exclude)
+
 
 manager = ConnectionManager()
 
+# Cached result of the last availability consensus check per trip:
+# trip_id -> (consensus dates, generate_options_prompt already sent).
+# Every write that can change participants, availability or the prompt
+# messages of a trip must drop its entry via invalidate_consensus_cache().
+_consensus_cache: Dict[str, Tuple[frozenset, bool]] = {}
+
+
+def invalidate_consensus_cache(trip_id: str):
+    """Forget the cached availability consensus for a trip."""
+    _consensus_cache.pop(trip_id, None)
+
 # Helper function for database operations with retry logic
 def update_participant_online_status(trip_id: str, user_id: int, is_online: bool) -> bool:
     """Update participant online status with retry logic and proper error handling"""
@@ -127,7 +198,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 await manager.connect(websocket, trip_id)
 
                 # Update participant online status with retry logic
-                update_participant_online_status(trip_id, user_id, True)
+                await asyncio.to_thread(update_participant_online_status, trip_id, user_id, True)
 
                 # Broadcast user joined
                 await manager.broadcast_to_trip(
@@ -140,7 +211,7 @@ async def websocket_endpoint(websocket: WebSocket):
             elif data["type"] == "leave_trip":
                 if trip_id and user_id:
                     # Update participant online status with retry logic
-                    update_participant_online_status(trip_id, user_id, False)
+                    await asyncio.to_thread(update_participant_online_status, trip_id, user_id, False)
 
                     manager.disconnect(websocket, trip_id)
 
@@ -167,7 +238,7 @@ async def websocket_endpoint(websocket: WebSocket):
             manager.disconnect(websocket, trip_id)
             if user_id:
                 # Update participant online status with retry logic
-                update_participant_online_status(trip_id, user_id, False)
+                await asyncio.to_thread(update_participant_online_status, trip_id, user_id, False)
 
                 # Broadcast user left
                 await manager.broadcast_to_trip(
@@ -182,19 +253,31 @@ async def websocket_endpoint(websocket: WebSocket):
             manager.disconnect(websocket, trip_id)
 
 
+def list_response(adapter: TypeAdapter, rows) -> Response:
+    """Validate ORM rows and encode them to JSON in one pass with a list adapter.
+
+    Field names are emitted by alias, matching what ``response_model`` produced.
+    """
+    items = adapter.validate_python(rows, from_attributes=True)
+    return Response(content=adapter.dump_json(items, by_alias=True),
+                    media_type="application/json")
+
+
 # API Routes
+# Handlers that only talk to the (sync) database session are plain ``def`` so
+# FastAPI runs them in its threadpool instead of blocking the event loop.
 @app.get("/api/trips/{trip_id}", response_model=schemas.Trip)
-async def get_trip(trip_id: str, db: Session = Depends(get_db)):
-    trip = db.query(Trip).filter(Trip.trip_id == trip_id).first()
+def get_trip(trip_id: str, db: Session = Depends(get_db)):
+    trip = load_trip(db, trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
     return trip
 
 
 @app.get("/api/trips/{trip_id}/join-info")
-async def get_join_info(trip_id: str,
-                        token: str,
-                        db: Session = Depends(get_db)):
+def get_join_info(trip_id: str,
+                  token: str,
+                  db: Session = Depends(get_db)):
     """Get trip information for joining via invite link"""
     trip = db.query(Trip).filter(Trip.trip_id == trip_id,
                                  Trip.invite_token == token).first()
@@ -300,31 +383,28 @@ async def join_trip(trip_id: str,
     db.add(join_message)
 
     db.commit()
+    invalidate_consensus_cache(trip_id)
 
-    # Broadcast new join message
+    # Broadcast new join message together with the user joined event
+    now_iso = datetime.utcnow().isoformat()
     db.refresh(join_message)
-    await manager.broadcast_to_trip(
-        trip_id, {
-            "type": "new_message",
-            "message": {
-                "id": join_message.id,
-                "trip_id": join_message.trip_id,
-                "user_id": join_message.user_id,
-                "type": join_message.type,
-                "content": join_message.content,
-                "timestamp": join_message.timestamp.isoformat()
-            },
-            "timestamp": datetime.utcnow().isoformat()
-        })
-
-    # Also broadcast user joined event
-    await manager.broadcast_to_trip(
-        trip_id, {
-            "type": "user_joined",
-            "user_id": user_id,
-            "display_name": display_name,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+    await manager.broadcast_many(trip_id, [{
+        "type": "new_message",
+        "message": {
+            "id": join_message.id,
+            "trip_id": join_message.trip_id,
+            "user_id": join_message.user_id,
+            "type": join_message.type,
+            "content": join_message.content,
+            "timestamp": join_message.timestamp.isoformat()
+        },
+        "timestamp": now_iso
+    }, {
+        "type": "user_joined",
+        "user_id": user_id,
+        "display_name": display_name,
+        "timestamp": now_iso
+    }])
 
     return {"user_id": user_id, "message": "Successfully joined trip"}
 
@@ -339,7 +419,7 @@ async def join_demo_trip(trip_id: str,
         raise HTTPException(status_code=404, detail="Demo trip not found")
     
     # Verify the demo trip exists
-    trip = db.query(Trip).filter(Trip.trip_id == trip_id).first()
+    trip = load_trip(db, trip_id)
     if not trip:
         raise HTTPException(status_code=404, detail="Demo trip not found")
 
@@ -397,37 +477,34 @@ async def join_demo_trip(trip_id: str,
     db.add(join_message)
 
     db.commit()
+    invalidate_consensus_cache(trip_id)
 
-    # Broadcast new join message
+    # Broadcast new join message together with the user joined event
+    now_iso = datetime.utcnow().isoformat()
     db.refresh(join_message)
-    await manager.broadcast_to_trip(
-        trip_id, {
-            "type": "new_message",
-            "message": {
-                "id": join_message.id,
-                "trip_id": join_message.trip_id,
-                "user_id": join_message.user_id,
-                "type": join_message.type,
-                "content": join_message.content,
-                "timestamp": join_message.timestamp.isoformat()
-            },
-            "timestamp": datetime.utcnow().isoformat()
-        })
-
-    # Also broadcast user joined event
-    await manager.broadcast_to_trip(
-        trip_id, {
-            "type": "user_joined",
-            "user_id": user_id,
-            "display_name": display_name,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+    await manager.broadcast_many(trip_id, [{
+        "type": "new_message",
+        "message": {
+            "id": join_message.id,
+            "trip_id": join_message.trip_id,
+            "user_id": join_message.user_id,
+            "type": join_message.type,
+            "content": join_message.content,
+            "timestamp": join_message.timestamp.isoformat()
+        },
+        "timestamp": now_iso
+    }, {
+        "type": "user_joined",
+        "user_id": user_id,
+        "display_name": display_name,
+        "timestamp": now_iso
+    }])
 
     return {"user_id": user_id, "message": "Successfully joined demo trip"}
 
 
 @app.post("/api/trips", response_model=schemas.Trip)
-async def create_trip(trip: schemas.TripCreate, db: Session = Depends(get_db)):
+def create_trip(trip: schemas.TripCreate, db: Session = Depends(get_db)):
     # Generate unique invite token
     invite_token = secrets.token_urlsafe(32)
 
@@ -463,15 +540,40 @@ async def create_trip(trip: schemas.TripCreate, db: Session = Depends(get_db)):
     db.add(welcome_message)
 
     db.commit()
+    invalidate_consensus_cache(trip.trip_id)
     return db_trip
 
 
 @app.get("/api/trips/{trip_id}/messages", response_model=list[schemas.Message])
-async def get_messages(trip_id: str, db: Session = Depends(get_db)):
+def get_messages(trip_id: str,
+                 cursor: Optional[int] = None,
+                 limit: Optional[int] = Query(None, ge=1, le=200),
+                 db: Session = Depends(get_db)):
+    """Chat history in chronological order.
+
+    Without ``limit`` the full history is returned. With it, only the newest
+    ``limit`` messages older than ``cursor`` (a message id) are returned, via
+    a keyset seek on (trip_id, id); the ``X-Next-Cursor`` header carries the
+    cursor for the next older page while more may exist.
+    """
     print(f"DEBUG: Getting messages for trip {trip_id}")
-    messages = db.query(Message).filter(Message.trip_id == trip_id).order_by(
-        Message.timestamp).all()
-    return messages
+    query = db.query(Message).filter(Message.trip_id == trip_id)
+
+    if limit is None and cursor is None:
+        # Rows inserted in one transaction share a server timestamp; id breaks ties
+        messages = query.order_by(Message.timestamp, Message.id).all()
+        return list_response(schemas.MessageListAdapter, messages)
+
+    limit = limit or 50
+    if cursor is not None:
+        query = query.filter(Message.id < cursor)
+    messages = query.order_by(Message.id.desc()).limit(limit).all()
+    messages.reverse()
+
+    response = list_response(schemas.MessageListAdapter, messages)
+    if len(messages) == limit:
+        response.headers["X-Next-Cursor"] = str(messages[0].id)
+    return response
 
 
 @app.post("/api/trips/{trip_id}/messages", response_model=schemas.Message)
@@ -622,10 +724,10 @@ async def create_message(trip_id: str,
 
 
 @app.get("/api/trips/{trip_id}/votes", response_model=list[schemas.Vote])
-async def get_votes(trip_id: str, db: Session = Depends(get_db)):
+def get_votes(trip_id: str, db: Session = Depends(get_db)):
     votes = db.query(Vote).filter(Vote.trip_id == trip_id,
                                   Vote.emoji == "👍").all()
-    return votes
+    return list_response(schemas.VoteListAdapter, votes)
 
 
 @app.post("/api/trips/{trip_id}/votes")
@@ -683,70 +785,78 @@ async def create_vote(trip_id: str,
         # Check for consensus after adding vote
         await check_voting_consensus(trip_id, db)
 
-        return schemas.Vote.from_orm(db_vote)
+        return schemas.Vote.model_validate(db_vote)
 
 
-async def check_voting_consensus(trip_id: str, db: Session, force_generate: bool = False):
-    """Check if voting consensus has been reached and generate detailed plan if so."""
+def latest_trip_options_message(db: Session, trip_id: str) -> Optional[Message]:
+    """Return the most recent agent message carrying trip options, if any."""
+    return db.query(Message).filter(
+        Message.trip_id == trip_id, Message.type == "agent",
+        Message.meta_data["type"].as_string() == "trip_options").order_by(
+            Message.timestamp.desc(), Message.id.desc()).first()
+
+
+def _prompt_filter(trip_id: str, prompt_type: str):
+    """Criteria matching a trip's agent prompt messages of the given metadata type."""
+    return (Message.trip_id == trip_id, Message.type == "agent",
+            Message.meta_data["type"].as_string() == prompt_type)
+
+
+def _find_prompt_message_ids(db: Session, trip_id: str, prompt_type: str) -> list[int]:
+    """Return ids of the trip's agent prompt messages with the given metadata type."""
+    return [
+        msg_id for (msg_id, ) in db.query(Message.id).filter(
+            *_prompt_filter(trip_id, prompt_type)).order_by(
+                Message.timestamp.desc(), Message.id.desc())
+    ]
+
+
+def _prompt_exists(db: Session, trip_id: str, prompt_type: str) -> bool:
+    """Whether the trip already has an agent prompt message of the given type."""
+    return db.query(exists().where(*_prompt_filter(trip_id, prompt_type))).scalar()
+
+
+async def check_voting_consensus(trip_id: str, db: Session, force_generate: bool = False) -> list[int]:
+    """Check if voting consensus has been reached and generate detailed plan if so.
+
+    Returns the ids of the detailed_plan_prompt messages that were inspected.
+    """
     # Get all participants and votes
     print(f"DEBUG: Checking voting consensus for trip {trip_id}")
-    participants = db.query(TripParticipant).filter(
-        TripParticipant.trip_id == trip_id).all()
-    votes = db.query(Vote).filter(Vote.trip_id == trip_id,
-                                  Vote.emoji == "👍").all()
-
-    # Find the agent message containing trip options
-    options_message: Optional[Message] = None
-    agent_messages = db.query(Message).filter(
-        Message.trip_id == trip_id, Message.type == "agent",
-        Message.meta_data.isnot(None)).order_by(
-            Message.timestamp.desc()).all()
+    prompt_ids = _find_prompt_message_ids(db, trip_id, "detailed_plan_prompt") if force_generate else []
+    total_participants = db.query(TripParticipant).filter(
+        TripParticipant.trip_id == trip_id).count()
 
-    for msg in agent_messages:
-        if isinstance(msg.meta_data,
-                      dict) and msg.meta_data.get("type") == "trip_options":
-            options_message = msg
-            break
+    # Tally distinct 👍 voters per option in SQL, in the order the options
+    # first received a vote
+    vote_counts = db.query(
+        Vote.option_id, func.count(distinct(Vote.user_id))).filter(
+            Vote.trip_id == trip_id, Vote.emoji == "👍").group_by(
+                Vote.option_id).order_by(func.min(Vote.id)).all()
 
-    # Use lightweight debug logs to avoid dumping large objects to stdout. This
-    # prevents BlockingIOError when the stdout pipe is saturated (happens on
-    # Cloud runners with limited buffer size).
-    # try:
-    #     print(
-    #         f"DEBUG: Participants={len(participants)}, Votes={len(votes)}, options_msg_id={(options_message.id if options_message else 'None')}"
-    #     )
-    # except BlockingIOError:
-    #     pass
+    if not total_participants or not vote_counts:
+        return prompt_ids
 
-    if not participants or not votes or not options_message:
-        return
+    # Find the agent message containing trip options
+    options_message = latest_trip_options_message(db, trip_id)
+    if not options_message:
+        return prompt_ids
 
     # Extract options from message metadata
     options = options_message.meta_data.get("options", [])
     if not options:
-        return
-
-    # Group votes by option
-    votes_by_option = {}
-    for vote in votes:
-        if vote.option_id not in votes_by_option:
-            votes_by_option[vote.option_id] = []
-        votes_by_option[vote.option_id].append(vote)
+        return prompt_ids
 
     try:
-        print(
-            f"DEBUG: Vote groups -> {[ (opt, len(vlist)) for opt, vlist in votes_by_option.items() ]}"
-        )
+        print(f"DEBUG: Vote groups -> {vote_counts}")
     except BlockingIOError:
         pass
 
     # Check if any option has 100% consensus
-    total_participants = len(participants)
     winning_option = None
 
-    for option_id, option_votes in votes_by_option.items():
-        unique_voters = set(vote.user_id for vote in option_votes)
-        if len(unique_voters) == total_participants:
+    for option_id, voter_count in vote_counts:
+        if voter_count == total_participants:
             winning_option = next(
                 (opt for opt in options if opt["option_id"] == option_id),
                 None)
@@ -766,27 +876,14 @@ async def check_voting_consensus(trip_id: str, db: Session, force_generate: bool
             Message.type == "detailed_plan").first()
 
         if existing_plan:
-            return
+            return prompt_ids
 
         if force_generate:
             # Directly generate detailed plan
-            await generate_detailed_trip_plan(trip_id, winning_option, db, manager)
+            await generate_detailed_trip_plan(trip_id, winning_option, db, manager, app.state.planner)
         else:
             # Send prompt message if not already present
-            prompt_exists = False
-
-            prompt_candidates = db.query(Message).filter(
-                Message.trip_id == trip_id,
-                Message.type == "agent",
-                Message.meta_data.isnot(None)
-            ).order_by(Message.timestamp.desc()).all()
-
-            for msg in prompt_candidates:
-                if isinstance(msg.meta_data, dict) and msg.meta_data.get("type") == "detailed_plan_prompt":
-                    prompt_exists = True
-                    break
-
-            if not prompt_exists:
+            if not _prompt_exists(db, trip_id, "detailed_plan_prompt"):
                 message_content = "🎉 Fantastic! Everyone's agreed on an itinerary option. When you're ready, click the *Start Deep Research* button below and I'll research the best places to visit and craft a day-by-day schedule!"
 
                 prompt_message = Message(
@@ -822,121 +919,131 @@ async def check_voting_consensus(trip_id: str, db: Session, force_generate: bool
                     }
                 )
 
+    return prompt_ids
 
-async def check_availability_consensus(trip_id: str, db: Session, force_generate: bool = False):
-    """Check if availability consensus has been reached and generate trip options if so."""
-    # Get all participants and availability
-    participants = db.query(TripParticipant).filter(
-        TripParticipant.trip_id == trip_id).all()
-    availability = db.query(DateAvailability).filter(
-        DateAvailability.trip_id == trip_id).all()
 
-    if not participants or not availability:
-        return
+class ConsensusResult(NamedTuple):
+    """Outcome of check_availability_consensus."""
+    consensus_dates: list[str]
+    existing_prompt_ids: list[int]
 
-    # ------------------------------------------------------------------
-    # Build a map of availability by date for ALL participants.
-    # A date reaches consensus **only** if every participant in the trip
-    # has explicitly marked themselves as available (True) for that date.
-    # ------------------------------------------------------------------
 
-    # Group availability records by date for quick lookup
-    availability_by_date: dict[str, list[DateAvailability]] = {}
-    for avail in availability:
-        date_str = avail.date.strftime("%Y-%m-%d")
-        availability_by_date.setdefault(date_str, []).append(avail)
+# Static texts for the generate_options_prompt message
+_PROMPT_MULTI = "🎉 Great news! We have dates that work for everyone. When you're ready, click the *Find Trip Options* button below and I'll propose some amazing itineraries!"
+_PROMPT_SOLO = "🎉 Great! I see you've selected your available dates. When you're ready, click the *Find Trip Options* button below and I'll propose some amazing itineraries!"
 
-    total_participants = len(participants)
-    consensus_dates: list[str] = []
 
-    for date_str, date_availability in availability_by_date.items():
-        # Build a set of participant ids who are available on this date
-        available_participants = {
-            avail.user_id for avail in date_availability if avail.available
-        }
+async def check_availability_consensus(trip_id: str, db: Session, force_generate: bool = False) -> ConsensusResult:
+    """Check if availability consensus has been reached and generate trip options if so.
 
-        # A consensus date requires every participant to be available.
-        if len(available_participants) == total_participants:
-            consensus_dates.append(date_str)
+    Returns the consensus dates and, when forced, the ids of the trip's
+    generate_options_prompt messages so the caller can flip them without
+    querying again.
+    """
+    participant_count: Optional[int] = None
+    prompt_ids = _find_prompt_message_ids(db, trip_id, "generate_options_prompt") if force_generate else []
+    cached = _consensus_cache.get(trip_id)
+
+    if cached is not None:
+        consensus_set, prompt_exists = cached
+    else:
+        participant_count = db.query(TripParticipant).filter(
+            TripParticipant.trip_id == trip_id).count()
+
+        # ------------------------------------------------------------------
+        # Count, per calendar day, how many distinct users marked themselves
+        # as available. A date reaches consensus **only** if every
+        # participant in the trip has explicitly marked themselves as
+        # available (True) for that date.
+        # ------------------------------------------------------------------
+        day = func.date(DateAvailability.date, type_=Date)
+        available_per_day = db.query(
+            day,
+            func.count(distinct(case(
+                (DateAvailability.available, DateAvailability.user_id))))
+        ).filter(DateAvailability.trip_id == trip_id).group_by(day).all()
+
+        if not participant_count or not available_per_day:
+            return ConsensusResult([], prompt_ids)
+
+        consensus_set = frozenset(
+            date.strftime("%Y-%m-%d")
+            for date, available_count in available_per_day
+            if available_count == participant_count
+        )
+
+        # Only look for an existing prompt once there is something to prompt about
+        if force_generate:
+            prompt_exists = bool(prompt_ids)
+        else:
+            prompt_exists = len(consensus_set) >= 3 and _prompt_exists(
+                db, trip_id, "generate_options_prompt")
+
+        _consensus_cache[trip_id] = (consensus_set, prompt_exists)
+
+    consensus_dates: list[str] = sorted(consensus_set)
 
     # Check if we have enough consensus dates (3 or more)
     # If we already have enough consensus dates, either prompt the group or, if explicitly requested (force_generate), start generation immediately.
     if len(consensus_dates) >= 3:
         if force_generate:
             # Caller explicitly wants to generate now (e.g. user clicked the button)
-            await generate_trip_options_internal(trip_id, consensus_dates, db, manager)
-        else:
+            await generate_trip_options_internal(trip_id, consensus_dates, db, manager, app.state.images)
+            # Generation removes the prompt messages
+            invalidate_consensus_cache(trip_id)
+        elif not prompt_exists:
             # Only send a single prompt message to avoid duplicates
-            prompt_exists = False
-
-            prompt_candidates = db.query(Message).filter(
-                Message.trip_id == trip_id,
-                Message.type == "agent",
-                Message.meta_data.isnot(None)
-            ).order_by(Message.timestamp.desc()).all()
+            if participant_count is None:
+                participant_count = db.query(TripParticipant).filter(
+                    TripParticipant.trip_id == trip_id).count()
 
-            for msg in prompt_candidates:
-                if isinstance(msg.meta_data, dict) and msg.meta_data.get("type") == "generate_options_prompt":
-                    prompt_exists = True
-                    break
+            # Adjust message content based on number of participants
+            message_content = _PROMPT_SOLO if participant_count == 1 else _PROMPT_MULTI
 
-            if not prompt_exists:
-                # Adjust message content based on number of participants
-                message_content = "🎉 Great news! We have dates that work for everyone. When you're ready, click the *Find Trip Options* button below and I'll propose some amazing itineraries!"
-                if len(participants) == 1:
-                    message_content = "🎉 Great! I see you've selected your available dates. When you're ready, click the *Find Trip Options* button below and I'll propose some amazing itineraries!"
-
-                prompt_message = Message(
-                    trip_id=trip_id,
-                    user_id=None,
-                    type="agent",
-                    content=message_content,
-                    meta_data={
-                        "type": "generate_options_prompt",
-                        "consensus_dates": consensus_dates
-                    }
-                )
-                db.add(prompt_message)
-                db.commit()
-                db.refresh(prompt_message)
+            prompt_message = Message(
+                trip_id=trip_id,
+                user_id=None,
+                type="agent",
+                content=message_content,
+                meta_data={
+                    "type": "generate_options_prompt",
+                    "consensus_dates": consensus_dates
+                }
+            )
+            db.add(prompt_message)
+            db.commit()
+            db.refresh(prompt_message)
+            _consensus_cache[trip_id] = (consensus_set, True)
 
-                # Broadcast the prompt so clients can render the button
-                await manager.broadcast_to_trip(
-                    trip_id,
-                    {
-                        "type": "new_message",
-                        "message": {
-                            "id": prompt_message.id,
-                            "trip_id": prompt_message.trip_id,
-                            "user_id": prompt_message.user_id,
-                            "type": prompt_message.type,
-                            "content": prompt_message.content,
-                            "timestamp": prompt_message.timestamp.isoformat(),
-                            "metadata": prompt_message.meta_data
-                        },
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
-                )
+            # Broadcast the prompt so clients can render the button
+            await manager.broadcast_to_trip(
+                trip_id,
+                {
+                    "type": "new_message",
+                    "message": {
+                        "id": prompt_message.id,
+                        "trip_id": prompt_message.trip_id,
+                        "user_id": prompt_message.user_id,
+                        "type": prompt_message.type,
+                        "content": prompt_message.content,
+                        "timestamp": prompt_message.timestamp.isoformat(),
+                        "metadata": prompt_message.meta_data
+                    },
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+            )
     elif force_generate:
         # Not enough consensus, but caller insists on generating anyway (edge-case / manual override)
-        await generate_trip_options_internal(trip_id, consensus_dates, db, manager)
+        await generate_trip_options_internal(trip_id, consensus_dates, db, manager, app.state.images)
+        invalidate_consensus_cache(trip_id)
 
+    return ConsensusResult(consensus_dates, prompt_ids)
 
 
 @app.get("/api/trips/{trip_id}/options")
-async def get_trip_options(trip_id: str, db: Session = Depends(get_db)):
+def get_trip_options(trip_id: str, db: Session = Depends(get_db)):
     # Find the agent message containing trip options
-    options_message: Optional[Message] = None
-    agent_messages = db.query(Message).filter(
-        Message.trip_id == trip_id, Message.type == "agent",
-        Message.meta_data.isnot(None)).order_by(
-            Message.timestamp.desc()).all()
-
-    for msg in agent_messages:
-        if isinstance(msg.meta_data,
-                      dict) and msg.meta_data.get("type") == "trip_options":
-            options_message = msg
-            break
+    options_message = latest_trip_options_message(db, trip_id)
 
     if not options_message:
         return []
@@ -949,43 +1056,67 @@ async def get_trip_options(trip_id: str, db: Session = Depends(get_db)):
 # ---------------------------------------------------------------------------
 
 
+def _broadcast_payload(msg) -> dict:
+    """Message fields as sent to clients inside new_message / update_message events."""
+    return {
+        "id": msg.id,
+        "trip_id": msg.trip_id,
+        "user_id": msg.user_id,
+        "type": msg.type,
+        "content": msg.content,
+        "timestamp": msg.timestamp.isoformat(),
+        "metadata": msg.meta_data
+    }
+
+
+def mark_prompts_triggered(db: Session, prompt_ids: list[int]):
+    """Set ``triggered`` on the given prompt messages with a single UPDATE.
+
+    Returns the updated rows (only those that were not triggered yet) so the
+    caller can broadcast them without reloading.
+    """
+    if not prompt_ids:
+        return []
+
+    if db.get_bind().dialect.name == "postgresql":
+        triggered_meta = func.jsonb_set(Message.meta_data,
+                                        literal_column("'{triggered}'"),
+                                        literal_column("'true'::jsonb"),
+                                        type_=Message.meta_data.type)
+    else:
+        triggered_meta = func.json_set(Message.meta_data, "$.triggered",
+                                       func.json("true"))
+
+    stmt = update(Message).where(
+        Message.id.in_(prompt_ids),
+        func.coalesce(Message.meta_data["triggered"].as_boolean(),
+                      False).is_(False)
+    ).values(meta_data=triggered_meta).returning(
+        Message.id, Message.trip_id, Message.user_id, Message.type,
+        Message.content, Message.timestamp, Message.meta_data
+    ).execution_options(synchronize_session=False)
+
+    updated = db.execute(stmt).all()
+    db.commit()
+    return updated
+
+
+
 @app.post("/api/trips/{trip_id}/generate-detailed-plan")
 async def trigger_generate_detailed_plan(trip_id: str, db: Session = Depends(get_db)):
     """Endpoint called when the group clicks *Generate Detailed Plan*."""
 
     # Force generation now
-    await check_voting_consensus(trip_id, db, force_generate=True)
-
-    # Mark any existing detailed plan prompt messages as triggered
-    prompt_messages = db.query(Message).filter(
-        Message.trip_id == trip_id,
-        Message.type == "agent",
-        Message.meta_data.isnot(None)
-    ).all()
-
-    for msg in prompt_messages:
-        if isinstance(msg.meta_data, dict) and msg.meta_data.get("type") == "detailed_plan_prompt" and not msg.meta_data.get("triggered"):
-            msg.meta_data["triggered"] = True
-            db.add(msg)
-            db.commit()
-            db.refresh(msg)
-
-            await manager.broadcast_to_trip(
-                trip_id,
-                {
-                    "type": "update_message",
-                    "message": {
-                        "id": msg.id,
-                        "trip_id": msg.trip_id,
-                        "user_id": msg.user_id,
-                        "type": msg.type,
-                        "content": msg.content,
-                        "timestamp": msg.timestamp.isoformat(),
-                        "metadata": msg.meta_data
-                    },
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-            )
+    prompt_ids = await check_voting_consensus(trip_id, db, force_generate=True)
+
+    # Mark the detailed plan prompt messages seen by the check as triggered
+    now_iso = datetime.utcnow().isoformat()
+    for msg in mark_prompts_triggered(db, prompt_ids):
+        await manager.broadcast_to_trip(trip_id, {
+            "type": "update_message",
+            "message": _broadcast_payload(msg),
+            "timestamp": now_iso
+        })
 
     return {"status": "detailed_plan_generation_requested"}
 
@@ -999,74 +1130,65 @@ async def trigger_generate_trip_options(trip_id: str, db: Session = Depends(get_
     """Endpoint that clients can call when the group decides it's time to generate itinerary options."""
 
     # Force generation now
-    await check_availability_consensus(trip_id, db, force_generate=True)
-
-    # Mark any existing generate_options_prompt messages as triggered to hide button
-    prompt_messages = db.query(Message).filter(
-        Message.trip_id == trip_id,
-        Message.type == "agent",
-        Message.meta_data.isnot(None)
-    ).all()
-
-    for msg in prompt_messages:
-        if isinstance(msg.meta_data, dict) and msg.meta_data.get("type") == "generate_options_prompt" and not msg.meta_data.get("triggered"):
-            msg.meta_data["triggered"] = True
-            db.add(msg)
-            db.commit()
-            db.refresh(msg)
-
-            await manager.broadcast_to_trip(
-                trip_id,
-                {
-                    "type": "update_message",
-                    "message": {
-                        "id": msg.id,
-                        "trip_id": msg.trip_id,
-                        "user_id": msg.user_id,
-                        "type": msg.type,
-                        "content": msg.content,
-                        "timestamp": msg.timestamp.isoformat(),
-                        "metadata": msg.meta_data
-                    },
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-            )
+    result = await check_availability_consensus(trip_id, db, force_generate=True)
+
+    # Mark the generate_options_prompt messages seen by the check as triggered to hide button
+    now_iso = datetime.utcnow().isoformat()
+    for msg in mark_prompts_triggered(db, result.existing_prompt_ids):
+        await manager.broadcast_to_trip(trip_id, {
+            "type": "update_message",
+            "message": _broadcast_payload(msg),
+            "timestamp": now_iso
+        })
 
     return {"status": "generation_requested"}
 
 
 @app.get("/api/trips/{trip_id}/participants",
          response_model=list[schemas.TripParticipant])
-async def get_participants(trip_id: str, db: Session = Depends(get_db)):
-    participants = db.query(TripParticipant).filter(
-        TripParticipant.trip_id == trip_id).all()
+def get_participants(trip_id: str, db: Session = Depends(get_db)):
+    # Load user data for all participants in the same query
+    participants = db.query(TripParticipant).options(
+        joinedload(TripParticipant.user)).filter(
+            TripParticipant.trip_id == trip_id).all()
 
-    # Load user data for each participant
-    for participant in participants:
-        participant.user = db.query(User).filter(
-            User.id == participant.user_id).first()
+    return list_response(schemas.ParticipantListAdapter, participants)
+
+
+def upsert_availability(db: Session, trip_id: str, user_id: int,
+                        dates: Dict[datetime, bool]) -> bool:
+    """Insert or update a user's availability for several dates in one statement.
 
-    return participants
+    Relies on the (trip_id, user_id, date) unique constraint. Returns whether
+    any row was inserted or actually changed its ``available`` value.
+    """
+    if not dates:
+        return False
+
+    dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(DateAvailability).values([
+        {"trip_id": trip_id, "user_id": user_id, "date": date, "available": available}
+        for date, available in dates.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["trip_id", "user_id", "date"],
+        set_={"available": stmt.excluded.available},
+        # Rows whose value is unchanged are neither rewritten nor returned
+        where=DateAvailability.available != stmt.excluded.available
+    ).returning(DateAvailability.id)
+
+    changed = bool(db.execute(stmt).all())
+    db.commit()
+    return changed
 
 
 @app.post("/api/trips/{trip_id}/availability")
 async def set_availability(trip_id: str,
                            availability: schemas.DateAvailabilityCreate,
                            db: Session = Depends(get_db)):
-    # Check if availability already exists
-    existing = db.query(DateAvailability).filter(
-        DateAvailability.trip_id == trip_id,
-        DateAvailability.user_id == availability.user_id,
-        DateAvailability.date == availability.date).first()
-
-    if existing:
-        existing.available = availability.available
-    else:
-        db_availability = DateAvailability(trip_id=trip_id,
-                                           **availability.dict())
-        db.add(db_availability)
-
-    db.commit()
+    if upsert_availability(db, trip_id, availability.user_id,
+                           {availability.date: availability.available}):
+        invalidate_consensus_cache(trip_id)
 
     # Check for availability consensus after updating
     await check_availability_consensus(trip_id, db)
@@ -1089,25 +1211,12 @@ async def set_availability_batch(trip_id: str,
     """Set multiple availability dates for a user at once."""
     user_id = batch.user_id
 
-    # Process all dates in the batch
-    for date_availability in batch.dates:
-        # Check if availability already exists
-        existing = db.query(DateAvailability).filter(
-            DateAvailability.trip_id == trip_id,
-            DateAvailability.user_id == user_id,
-            DateAvailability.date == date_availability.date).first()
-
-        if existing:
-            existing.available = date_availability.available
-        else:
-            db_availability = DateAvailability(
-                trip_id=trip_id,
-                user_id=user_id,
-                date=date_availability.date,
-                available=date_availability.available)
-            db.add(db_availability)
-
-    db.commit()
+    # Upsert all dates in the batch at once (a later entry for the same date wins)
+    if upsert_availability(db, trip_id, user_id, {
+            date_availability.date: date_availability.available
+            for date_availability in batch.dates
+    }):
+        invalidate_consensus_cache(trip_id)
 
     # Check for availability consensus after updating all dates
     await check_availability_consensus(trip_id, db)
@@ -1126,10 +1235,10 @@ async def set_availability_batch(trip_id: str,
 
 @app.get("/api/trips/{trip_id}/availability",
          response_model=list[schemas.DateAvailability])
-async def get_availability(trip_id: str, db: Session = Depends(get_db)):
+def get_availability(trip_id: str, db: Session = Depends(get_db)):
     availability = db.query(DateAvailability).filter(
         DateAvailability.trip_id == trip_id).all()
-    return availability
+    return list_response(schemas.DateAvailabilityListAdapter, availability)
 
 
 @app.post("/api/trips/{trip_id}/preferences",
@@ -1165,14 +1274,6 @@ async def set_preferences(
 
     db.commit()
 
-    # Broadcast preferences update
-    await manager.broadcast_to_trip(
-        trip_id, {
-            "type": "preferences_update",
-            "user_id": user_id,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-
     # Generate AI context message
     user = db.query(User).filter(User.id == user_id).first()
     preferences_text = f"{user.display_name} has shared their preferences:\n"
@@ -1194,21 +1295,25 @@ async def set_preferences(
     db.add(system_message)
     db.commit()
 
-    # Broadcast new message
+    # Broadcast preferences update and the new message in one frame
+    now_iso = datetime.utcnow().isoformat()
     db.refresh(system_message)
-    await manager.broadcast_to_trip(
-        trip_id, {
-            "type": "new_message",
-            "message": {
-                "id": system_message.id,
-                "trip_id": system_message.trip_id,
-                "user_id": system_message.user_id,
-                "type": system_message.type,
-                "content": system_message.content,
-                "timestamp": system_message.timestamp.isoformat()
-            },
-            "timestamp": datetime.utcnow().isoformat()
-        })
+    await manager.broadcast_many(trip_id, [{
+        "type": "preferences_update",
+        "user_id": user_id,
+        "timestamp": now_iso
+    }, {
+        "type": "new_message",
+        "message": {
+            "id": system_message.id,
+            "trip_id": system_message.trip_id,
+            "user_id": system_message.user_id,
+            "type": system_message.type,
+            "content": system_message.content,
+            "timestamp": system_message.timestamp.isoformat()
+        },
+        "timestamp": now_iso
+    }])
 
     # Since we start with COLLECTING_DATES, we don't need state transitions here
     # Just provide helpful guidance after preferences are submitted
@@ -1222,9 +1327,9 @@ async def set_preferences(
 
 @app.get("/api/trips/{trip_id}/preferences/{user_id}",
          response_model=schemas.UserPreferences)
-async def get_preferences(trip_id: str,
-                          user_id: int,
-                          db: Session = Depends(get_db)):
+def get_preferences(trip_id: str,
+                    user_id: int,
+                    db: Session = Depends(get_db)):
     preferences = db.query(UserPreferences).filter(
         UserPreferences.trip_id == trip_id,
         UserPreferences.user_id == user_id).first()
@@ -1236,14 +1341,15 @@ async def get_preferences(trip_id: str,
 
 
 @app.get("/api/trips/{trip_id}/missing-preferences")
-async def get_missing_preferences(trip_id: str, db: Session = Depends(get_db)):
-    participants = db.query(TripParticipant).filter(
-        TripParticipant.trip_id == trip_id,
-        TripParticipant.has_submitted_preferences == False).all()
+def get_missing_preferences(trip_id: str, db: Session = Depends(get_db)):
+    participants = db.query(TripParticipant).options(
+        joinedload(TripParticipant.user)).filter(
+            TripParticipant.trip_id == trip_id,
+            TripParticipant.has_submitted_preferences == False).all()
 
     missing_users = []
     for participant in participants:
-        user = db.query(User).filter(User.id == participant.user_id).first()
+        user = participant.user
         if user:
             missing_users.append({
                 "user_id": user.id,
@@ -1253,30 +1359,37 @@ async def get_missing_preferences(trip_id: str, db: Session = Depends(get_db)):
     return {"missing_preferences": missing_users}
 
 
+# Demo dates Bob can't make in reset_carol
+_BOB_SKIP = frozenset((datetime(2025, 10, 19), datetime(2025, 10, 20)))
+
+
 @app.post("/api/reset-carol")
 async def reset_carol(request: dict, db: Session = Depends(get_db)):
     trip_id = request.get("tripId")
     user_id = request.get("userId")
 
 
+    # Nothing of this trip is loaded in the session yet, so the bulk deletes
+    # below skip the identity-map sync
+
     # Delete ALL participants for this trip
     db.query(TripParticipant).filter(
-        TripParticipant.trip_id == trip_id).delete()
+        TripParticipant.trip_id == trip_id).delete(synchronize_session=False)
 
 
     # Delete ALL preferences for this trip
     db.query(UserPreferences).filter(
-        UserPreferences.trip_id == trip_id).delete()
+        UserPreferences.trip_id == trip_id).delete(synchronize_session=False)
 
     # Delete ALL availability for this trip
     db.query(DateAvailability).filter(
-        DateAvailability.trip_id == trip_id).delete()
+        DateAvailability.trip_id == trip_id).delete(synchronize_session=False)
 
     # Delete ALL messages for this trip to reset chat completely
-    db.query(Message).filter(Message.trip_id == trip_id).delete()
+    db.query(Message).filter(Message.trip_id == trip_id).delete(synchronize_session=False)
 
     # Delete ALL votes for this trip
-    db.query(Vote).filter(Vote.trip_id == trip_id).delete()
+    db.query(Vote).filter(Vote.trip_id == trip_id).delete(synchronize_session=False)
 
     # Reset ALL participants' status
     db.query(TripParticipant).filter(
@@ -1297,61 +1410,59 @@ async def reset_carol(request: dict, db: Session = Depends(get_db)):
     db.commit()
 
     # Add participants - Alice and Bob have submitted preferences, Carol hasn't
-    participants = [
-        TripParticipant(trip_id=trip_id,
-                        user_id=1,
-                        role="organizer",
-                        has_submitted_preferences=True),
-        TripParticipant(trip_id=trip_id,
-                        user_id=2,
-                        role="traveler",
-                        has_submitted_preferences=True),
-    ]
-
-    for participant in participants:
-        db.add(participant)
+    # The demo rows below go in as bulk INSERTs; nothing needs identity-map tracking
+    db.execute(insert(TripParticipant), [
+        dict(trip_id=trip_id,
+             user_id=1,
+             role="organizer",
+             has_submitted_preferences=True),
+        dict(trip_id=trip_id,
+             user_id=2,
+             role="traveler",
+             has_submitted_preferences=True),
+    ])
 
     # Recreate initial messages
     initial_messages = [
-        Message(
+        dict(
             trip_id=trip_id,
             user_id=None,
             type="agent",
             content=
             "Welcome to TripSync AI! I'll help your group plan the perfect trip to Barcelona. Let's start by gathering everyone's preferences."
         ),
-        Message(
+        dict(
             trip_id=trip_id,
             user_id=1,
             type="user",
             content="Hey everyone! So excited to plan our Barcelona trip 🇪🇸"),
-        Message(
+        dict(
             trip_id=trip_id,
             user_id=2,
             type="user",
             content="Barcelona sounds amazing! I've always wanted to visit, but let's also go to Valencia!"),
-        Message(
+        dict(
             trip_id=trip_id,
             user_id=1,
             type="user",
             content=
             "I'm thinking October would be perfect - great weather and fewer crowds! Budget of around $1,200 per person for 5 days?"
         ),
-        Message(
+        dict(
             trip_id=trip_id,
             user_id=None,
             type="agent",
             content=
             "Great to have everyone here! I see we're planning for October with a budget of around $1,200 per person for 5 days. To create the perfect itinerary for your group, I'll need to understand everyone's preferences.\n\nAlice and Bob have shared their travel styles. When other travelers join, please share your preferences too so I can create the perfect trip for everyone!"
         ),
-        Message(
+        dict(
             trip_id=trip_id,
             user_id=2,
             type="user",
             content=
             "Perfect! October works for me. I'm flexible on dates but prefer mid-month. Budget looks good too! 👍"
         ),
-        Message(
+        dict(
             trip_id=trip_id,
             user_id=None,
             type="agent",
@@ -1363,7 +1474,7 @@ async def reset_carol(request: dict, db: Session = Depends(get_db)):
             content=
             "Excellent! Barcelona in October is a fantastic choice. Now let's coordinate your dates - I need everyone to mark their availability on the calendar below. Click on the dates you're available to travel!"
         ),
-        Message(
+        dict(
             trip_id=trip_id,
             user_id=None,
             type="agent",
@@ -1372,11 +1483,10 @@ async def reset_carol(request: dict, db: Session = Depends(get_db)):
         ),
     ]
 
-    for msg in initial_messages:
-        db.add(msg)
+    db.execute(insert(Message), initial_messages)
 
     # Add Alice and Bob's preferences back
-    alice_prefs = UserPreferences(
+    alice_prefs = dict(
         user_id=1,
         trip_id=trip_id,
         budget_preference="medium",
@@ -1391,7 +1501,7 @@ async def reset_carol(request: dict, db: Session = Depends(get_db)):
             "Food tours sound amazing"
         ])
 
-    bob_prefs = UserPreferences(
+    bob_prefs = dict(
         user_id=2,
         trip_id=trip_id,
         budget_preference="medium",
@@ -1406,8 +1516,7 @@ async def reset_carol(request: dict, db: Session = Depends(get_db)):
             
         ])
 
-    db.add(alice_prefs)
-    db.add(bob_prefs)
+    db.execute(insert(UserPreferences), [alice_prefs, bob_prefs])
 
     # Update Alice and Bob's participant status
     db.query(TripParticipant).filter(
@@ -1428,43 +1537,26 @@ async def reset_carol(request: dict, db: Session = Depends(get_db)):
     ]
 
     # Alice is available for all dates
-    for date in october_dates:
-        alice_avail = DateAvailability(trip_id=trip_id,
-                                       user_id=1,
-                                       date=date,
-                                       available=True)
-        db.add(alice_avail)
-
-    # Bob is NOT available on Oct 15-16 (creates conflict)
-    for date in october_dates:
-        bob_avail = DateAvailability(trip_id=trip_id,
-                                     user_id=2,
-                                     date=date,
-                                     available=date not in [
-                                         datetime(2025, 10, 19),
-                                         datetime(2025, 10, 20)
-                                     ])
-        db.add(bob_avail)
+    # Bob is NOT available on Oct 19-20 (creates conflict)
+    db.execute(insert(DateAvailability), [
+        dict(trip_id=trip_id, user_id=1, date=date, available=True)
+        for date in october_dates
+    ] + [
+        dict(trip_id=trip_id, user_id=2, date=date, available=date not in _BOB_SKIP)
+        for date in october_dates
+    ])
 
     # Clear existing votes
-    db.query(Vote).filter(Vote.trip_id == trip_id).delete()
+    db.query(Vote).filter(Vote.trip_id == trip_id).delete(synchronize_session=False)
 
     # Add votes for Alice and Bob on the first option ("cultural")
-    alice_vote = Vote(
-        trip_id=trip_id,
-        user_id=1,  # Alice
-        option_id="option_1",
-        emoji="👍")
-    db.add(alice_vote)
-
-    bob_vote = Vote(
-        trip_id=trip_id,
-        user_id=2,  # Bob
-        option_id="option_1",
-        emoji="👍")
-    db.add(bob_vote)
+    db.execute(insert(Vote), [
+        dict(trip_id=trip_id, user_id=1, option_id="option_1", emoji="👍"),  # Alice
+        dict(trip_id=trip_id, user_id=2, option_id="option_1", emoji="👍"),  # Bob
+    ])
 
     db.commit()
+    invalidate_consensus_cache(trip_id)
 
     # Broadcast update to all connected clients
     await manager.broadcast_to_trip(trip_id, {
@@ -1657,42 +1749,100 @@ async def reset_carol(request: dict, db: Session = Depends(get_db)):
 #     db.commit()
 
 
-@app.get("/api/geocode")
-async def geocode_location(q: str):
-    """Proxy geocoding requests to avoid CORS issues"""
+@app.get("/api/metrics")
+def get_metrics():
+    """Connection pool and WebSocket counters for monitoring."""
+    return {
+        "db_pool": pool_status(),
+        "websocket_connections": sum(
+            len(connections) for connections in manager.active_connections.values()),
+    }
+
+
+# Geocoding results keyed by normalized query. Nominatim allows ~1 req/s, so
+# hits are kept for a day and misses for 5 minutes; errors are not cached.
+_geocode_cache = TTLCache(maxsize=10_000)
+# Upstream lookups in progress; concurrent callers for the same key await
+# the same task instead of issuing their own request
+_geocode_inflight: Dict[str, asyncio.Task] = {}
+GEOCODE_TTL = 24 * 60 * 60
+GEOCODE_MISS_TTL = 5 * 60
+
+
+async def _geocode_upstream(client: httpx.AsyncClient, q: str) -> dict:
+    """Query Nominatim and cache the outcome; errors are returned, not cached."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={
-                    "format": "json",
-                    "q": q,
-                    "limit": 1
-                },
-                headers={
-                    "User-Agent": "TripSyncAI/1.0 (+https://TripSync.ai)"
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            if data and len(data) > 0:
-                return {
-                    "lat": float(data[0]["lat"]),
-                    "lon": float(data[0]["lon"]),
-                    "display_name": data[0]["display_name"]
-                }
-            else:
-                return {"error": "No results found"}
-                
+        response = await client.get(
+            "https://nominatim.openstreetmap.org/search",
+            params={
+                "format": "json",
+                "q": q,
+                "limit": 1
+            },
+            headers={
+                "User-Agent": "TripSyncAI/1.0 (+https://TripSync.ai)"
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
     except Exception as e:
         return {"error": str(e)}
 
+    key = q.strip().lower()
+    if data and len(data) > 0:
+        result = {
+            "lat": float(data[0]["lat"]),
+            "lon": float(data[0]["lon"]),
+            "display_name": data[0]["display_name"]
+        }
+        _geocode_cache.set(key, result, GEOCODE_TTL)
+    else:
+        result = {"error": "No results found"}
+        _geocode_cache.set(key, result, GEOCODE_MISS_TTL)
+    return result
+
+
+@app.get("/api/geocode")
+async def geocode_location(q: str, request: Request):
+    """Proxy geocoding requests to avoid CORS issues"""
+    key = q.strip().lower()
+    cached = _geocode_cache.get(key)
+    if cached is not None:
+        return cached
+
+    task = _geocode_inflight.get(key)
+    if task is None:
+        # The lookup runs in its own task, not in the first caller's handler,
+        # so no disconnecting caller (the first one included) cancels it for
+        # the others
+        task = asyncio.create_task(_geocode_upstream(request.app.state.http, q))
+        _geocode_inflight[key] = task
+        task.add_done_callback(lambda _: _geocode_inflight.pop(key, None))
+    return await asyncio.shield(task)
+
 
 # In development mode, proxy to Vite dev server
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names are content hashes, cacheable forever."""
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+# Generated itinerary images; mounted before the catch-all routes below
+IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+app.mount("/images", ImmutableStaticFiles(directory=IMAGE_DIR), name="images")
+
 if os.getenv("NODE_ENV") == "development":
-    from fastapi import Request
-    import httpx
+    from starlette.background import BackgroundTask
+
+    # Connection-level headers that must not be forwarded by a proxy
+    HOP_BY_HOP_HEADERS = {
+        "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+        "te", "trailers", "transfer-encoding", "upgrade"
+    }
 
     @app.api_route(
         "/{path:path}",
@@ -1702,23 +1852,32 @@ if os.getenv("NODE_ENV") == "development":
         if path.startswith("api/") or path == "ws":
             raise HTTPException(status_code=404, detail="Not found")
 
-        # Proxy to Vite dev server
-        async with httpx.AsyncClient() as client:
-            url = f"http://localhost:5173/{path}"
-            headers = dict(request.headers)
-            headers.pop("host", None)
-
-            response = await client.request(
-                method=request.method,
-                url=url,
-                headers=headers,
-                params=request.query_params,
-                content=await request.body()
-                if request.method in ["POST", "PUT", "PATCH"] else None)
-
-            return Response(content=response.content,
-                            status_code=response.status_code,
-                            headers=dict(response.headers))
+        # Stream to and from the Vite dev server over the shared client
+        client = request.app.state.http
+        url = f"http://localhost:5173/{path}"
+        headers = dict(request.headers)
+        headers.pop("host", None)
+
+        upstream_request = client.build_request(
+            method=request.method,
+            url=url,
+            headers=headers,
+            params=request.query_params,
+            content=request.stream()
+            if request.method in ["POST", "PUT", "PATCH"] else None,
+            # First-time module transforms in Vite can take a while
+            timeout=30.0)
+        upstream = await client.send(upstream_request, stream=True)
+
+        response_headers = {
+            name: value
+            for name, value in upstream.headers.items()
+            if name.lower() not in HOP_BY_HOP_HEADERS
+        }
+        return StreamingResponse(upstream.aiter_raw(),
+                                 status_code=upstream.status_code,
+                                 headers=response_headers,
+                                 background=BackgroundTask(upstream.aclose))
 else:
     # Serve static files in production
     dist_path = Path("dist/public")
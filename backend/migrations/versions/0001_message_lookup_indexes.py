@@ -0,0 +1,37 @@
+"""Indexes for the message lookups in the consensus checks
+
+Tables are created by Base.metadata.create_all on startup; this revision
+adds the message indexes to databases that were created before them.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-14
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_messages_trip_type_ts", "messages",
+                    ["trip_id", "type", "timestamp"],
+                    if_not_exists=True)
+    op.create_index("ix_messages_meta_type", "messages",
+                    [sa.text("(CAST(meta_data ->> 'type' AS VARCHAR))")],
+                    if_not_exists=True)
+    op.create_index(
+        "ix_prompt_exists", "messages", ["trip_id"],
+        postgresql_where=sa.text(
+            "type = 'agent' AND CAST(meta_data ->> 'type' AS VARCHAR) IN "
+            "('generate_options_prompt', 'detailed_plan_prompt')"),
+        if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index("ix_prompt_exists", table_name="messages", if_exists=True)
+    op.drop_index("ix_messages_meta_type", table_name="messages", if_exists=True)
+    op.drop_index("ix_messages_trip_type_ts", table_name="messages", if_exists=True)
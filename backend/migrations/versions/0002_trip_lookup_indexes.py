@@ -0,0 +1,42 @@
+"""Composite trip_id indexes on participants, messages, votes, availability and options
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-14
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_messages_trip_ts", "messages", ["trip_id", "timestamp"]),
+    ("ix_votes_trip_option", "votes", ["trip_id", "option_id"]),
+    ("ix_votes_trip_user", "votes", ["trip_id", "user_id"]),
+    ("ix_avail_trip_user", "date_availability", ["trip_id", "user_id", "date"]),
+    ("ix_options_trip_type", "trip_options", ["trip_id", "type"]),
+    ("ix_user_preferences_trip_id", "user_preferences", ["trip_id"]),
+]
+
+
+def upgrade():
+    # A user may only join a trip once; drop duplicate rows before the
+    # unique index, keeping the earliest join
+    op.execute(
+        "DELETE FROM trip_participants WHERE id NOT IN "
+        "(SELECT MIN(id) FROM trip_participants GROUP BY trip_id, user_id)")
+    op.create_index("ix_participants_trip_user", "trip_participants",
+                    ["trip_id", "user_id"], unique=True, if_not_exists=True)
+
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
+    op.drop_index("ix_participants_trip_user", table_name="trip_participants",
+                  if_exists=True)
@@ -0,0 +1,31 @@
+"""Unique (trip_id, user_id, date) on date_availability for upserts
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-14
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep only the most recent row for each user and date
+    op.execute(
+        "DELETE FROM date_availability WHERE id NOT IN "
+        "(SELECT MAX(id) FROM date_availability GROUP BY trip_id, user_id, date)")
+    # The constraint's index replaces the plain composite one from 0002
+    op.drop_index("ix_avail_trip_user", table_name="date_availability",
+                  if_exists=True)
+    op.create_unique_constraint("uq_avail", "date_availability",
+                                ["trip_id", "user_id", "date"])
+
+
+def downgrade():
+    op.drop_constraint("uq_avail", "date_availability", type_="unique")
+    op.create_index("ix_avail_trip_user", "date_availability",
+                    ["trip_id", "user_id", "date"], if_not_exists=True)
@@ -0,0 +1,66 @@
+"""Enum types for trips.state, trip_participants.role and messages.type
+
+Rows holding a value outside the domain make the conversion fail; fix
+them before upgrading.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-14
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+ENUM_COLUMNS = [
+    ("trips", "state",
+     sa.Enum("INIT", "COLLECTING_PREFS", "COLLECTING_DATES",
+             "GENERATING_HIGH_OPTIONS", "VOTING_HIGH_LEVEL",
+             "DETAILED_PLAN_READY", "GENERATING_DETAIL_OPTIONS",
+             "HOTELS_FLIGHTS_READY", "BOOKED", name="trip_state")),
+    ("trip_participants", "role",
+     sa.Enum("organizer", "traveler", name="participant_role")),
+    ("messages", "type",
+     sa.Enum("user", "agent", "system", "detailed_plan", name="message_type")),
+]
+
+PROMPT_INDEX_WHERE = (
+    "type = 'agent' AND CAST(meta_data ->> 'type' AS VARCHAR) IN "
+    "('generate_options_prompt', 'detailed_plan_prompt')")
+
+
+def upgrade():
+    # Other databases (SQLite in development) get the CHECK constraints
+    # from create_all
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    # The partial index predicate compares messages.type to text; rebuild it
+    # against the enum column
+    op.drop_index("ix_prompt_exists", table_name="messages", if_exists=True)
+
+    for table, column, enum in ENUM_COLUMNS:
+        enum.create(op.get_bind(), checkfirst=True)
+        op.alter_column(table, column, type_=enum,
+                        postgresql_using=f"{column}::{enum.name}")
+
+    op.create_index("ix_prompt_exists", "messages", ["trip_id"],
+                    postgresql_where=sa.text(PROMPT_INDEX_WHERE))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.drop_index("ix_prompt_exists", table_name="messages", if_exists=True)
+
+    for table, column, enum in ENUM_COLUMNS:
+        op.alter_column(table, column, type_=sa.String(),
+                        postgresql_using=f"{column}::varchar")
+        enum.drop(op.get_bind(), checkfirst=True)
+
+    op.create_index("ix_prompt_exists", "messages", ["trip_id"],
+                    postgresql_where=sa.text(PROMPT_INDEX_WHERE))
@@ -0,0 +1,22 @@
+"""(trip_id, id) index for keyset pagination of messages
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-14
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_messages_trip_id_id", "messages", ["trip_id", "id"],
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index("ix_messages_trip_id_id", table_name="messages",
+                  if_exists=True)
@@ -0,0 +1,40 @@
+"""Store meta_data as JSONB and add a GIN index on messages.meta_data
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-14
+"""
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+TABLES = ["messages", "trip_options"]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for table in TABLES:
+        op.alter_column(table, "meta_data", type_=postgresql.JSONB(),
+                        postgresql_using="meta_data::jsonb")
+
+    op.create_index("ix_messages_meta_gin", "messages", ["meta_data"],
+                    postgresql_using="gin",
+                    postgresql_ops={"meta_data": "jsonb_path_ops"},
+                    if_not_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.drop_index("ix_messages_meta_gin", table_name="messages", if_exists=True)
+
+    for table in TABLES:
+        op.alter_column(table, "meta_data", type_=postgresql.JSON(),
+                        postgresql_using="meta_data::json")
@@ -0,0 +1,52 @@
+"""Database-generated timestamptz columns
+
+Existing values were written as naive UTC by the application, so they are
+converted with AT TIME ZONE 'UTC'.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-14
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ("trips", "created_at"),
+    ("trips", "updated_at"),
+    ("trip_participants", "joined_at"),
+    ("messages", "timestamp"),
+    ("user_preferences", "created_at"),
+    ("votes", "timestamp"),
+    ("trip_options", "created_at"),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for table, column in COLUMNS:
+        op.execute(f'UPDATE {table} SET "{column}" = now() AT TIME ZONE \'UTC\' '
+                   f'WHERE "{column}" IS NULL')
+        op.alter_column(table, column,
+                        type_=sa.DateTime(timezone=True),
+                        postgresql_using=f'"{column}" AT TIME ZONE \'UTC\'',
+                        server_default=sa.func.now(),
+                        nullable=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for table, column in COLUMNS:
+        op.alter_column(table, column,
+                        type_=sa.DateTime(),
+                        postgresql_using=f'"{column}" AT TIME ZONE \'UTC\'',
+                        server_default=None,
+                        nullable=True)
@@ -0,0 +1,47 @@
+"""Compress large meta_data values with lz4
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-14
+"""
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+TABLES = ["messages", "trip_options"]
+
+
+def _set_compression(method: str):
+    # Column compression needs PostgreSQL 14+ built with lz4; a no-op otherwise.
+    # Applies to newly written values, existing rows keep theirs until rewritten.
+    # EXECUTE keeps older servers from rejecting the syntax up front.
+    statements = " ".join(
+        f"EXECUTE 'ALTER TABLE {table} ALTER COLUMN meta_data SET COMPRESSION {method}';"
+        for table in TABLES)
+    op.execute(f"""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_settings
+                       WHERE name = 'default_toast_compression'
+                         AND 'lz4' = ANY(enumvals)) THEN
+                {statements}
+            END IF;
+        END $$
+    """)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    _set_compression("lz4")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    _set_compression("pglz")
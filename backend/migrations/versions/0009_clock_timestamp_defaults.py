@@ -0,0 +1,42 @@
+"""Per-statement timestamp defaults
+
+now() is the transaction start time, so rows inserted in one commit shared a
+timestamp; clock_timestamp() keeps them in insertion order.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-14
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ("trips", "created_at"),
+    ("trips", "updated_at"),
+    ("trip_participants", "joined_at"),
+    ("messages", "timestamp"),
+    ("user_preferences", "created_at"),
+    ("votes", "timestamp"),
+    ("trip_options", "created_at"),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for table, column in COLUMNS:
+        op.alter_column(table, column, server_default=sa.text("clock_timestamp()"))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for table, column in COLUMNS:
+        op.alter_column(table, column, server_default=sa.func.now())
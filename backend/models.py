@@ -1,10 +1,53 @@
-from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, ForeignKey, Boolean, Float
+from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, ForeignKey, Boolean, Index, UniqueConstraint, Enum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.dialects.postgresql import JSONB
+import os
 
 Base = declarative_base()
 
+# Loader strategy for one-to-many collections. Endpoints query child rows
+# directly or eager-load with selectinload/joinedload, so in development an
+# accidental lazy load (an N+1 in a loop) raises instead of silently querying.
+COLLECTION_LAZY = "raise" if os.getenv("NODE_ENV") == "development" else "select"
+
+# JSON documents are stored as binary, indexable JSONB on PostgreSQL
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
+
+class utcnow(FunctionElement):
+    """Row timestamp default: the wall-clock time of each statement.
+
+    PostgreSQL's now() is fixed at transaction start, which would give every
+    row inserted in one commit the same timestamp.
+    """
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "clock_timestamp()"
+
+
+# Fixed value domains: native ENUM types on PostgreSQL, CHECK constraints elsewhere
+TripState = Enum("INIT", "COLLECTING_PREFS", "COLLECTING_DATES",
+                 "GENERATING_HIGH_OPTIONS", "VOTING_HIGH_LEVEL",
+                 "DETAILED_PLAN_READY", "GENERATING_DETAIL_OPTIONS",
+                 "HOTELS_FLIGHTS_READY", "BOOKED",
+                 name="trip_state", create_constraint=True)
+ParticipantRole = Enum("organizer", "traveler",
+                       name="participant_role", create_constraint=True)
+MessageType = Enum("user", "agent", "system", "detailed_plan",
+                   name="message_type", create_constraint=True)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -17,10 +60,10 @@ class User(Base):
     home_city = Column(String, nullable=True)
     
     # Relationships
-    messages = relationship("Message", back_populates="user")
-    participations = relationship("TripParticipant", back_populates="user")
-    votes = relationship("Vote", back_populates="user")
-    availability = relationship("DateAvailability", back_populates="user")
+    messages = relationship("Message", back_populates="user", lazy=COLLECTION_LAZY)
+    participations = relationship("TripParticipant", back_populates="user", lazy=COLLECTION_LAZY)
+    votes = relationship("Vote", back_populates="user", lazy=COLLECTION_LAZY)
+    availability = relationship("DateAvailability", back_populates="user", lazy=COLLECTION_LAZY)
     preferences = relationship("UserPreferences", back_populates="user", uselist=False)
 
 class Trip(Base):
@@ -33,17 +76,17 @@ class Trip(Base):
     start_date = Column(DateTime, nullable=True)
     end_date = Column(DateTime, nullable=True)
     budget = Column(Integer, nullable=True)
-    state = Column(String, nullable=False, default="INIT") 
+    state = Column(TripState, nullable=False, default="INIT")
     invite_token = Column(String, unique=True, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=utcnow(), onupdate=utcnow(), nullable=False)
     
     # Relationships
-    participants = relationship("TripParticipant", back_populates="trip")
-    messages = relationship("Message", back_populates="trip")
-    options = relationship("TripOption", back_populates="trip")
-    votes = relationship("Vote", back_populates="trip")
-    availability = relationship("DateAvailability", back_populates="trip")
+    participants = relationship("TripParticipant", back_populates="trip", lazy=COLLECTION_LAZY)
+    messages = relationship("Message", back_populates="trip", lazy=COLLECTION_LAZY)
+    options = relationship("TripOption", back_populates="trip", lazy=COLLECTION_LAZY)
+    votes = relationship("Vote", back_populates="trip", lazy=COLLECTION_LAZY)
+    availability = relationship("DateAvailability", back_populates="trip", lazy=COLLECTION_LAZY)
 
 class TripParticipant(Base):
     __tablename__ = "trip_participants"
@@ -51,12 +94,17 @@ class TripParticipant(Base):
     id = Column(Integer, primary_key=True, index=True)
     trip_id = Column(String, ForeignKey("trips.trip_id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    role = Column(String, nullable=False, default="traveler")
+    role = Column(ParticipantRole, nullable=False, default="traveler")
     is_online = Column(Boolean, default=False)
-    joined_at = Column(DateTime, default=datetime.utcnow)
+    joined_at = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
     has_submitted_preferences = Column(Boolean, default=False)
     has_submitted_availability = Column(Boolean, default=False)
     
+    __table_args__ = (
+        # One row per user per trip; also serves trip_id-only lookups
+        Index("ix_participants_trip_user", "trip_id", "user_id", unique=True),
+    )
+    
     # Relationships
     trip = relationship("Trip", back_populates="participants")
     user = relationship("User", back_populates="participations")
@@ -67,10 +115,28 @@ class Message(Base):
     id = Column(Integer, primary_key=True, index=True)
     trip_id = Column(String, ForeignKey("trips.trip_id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    type = Column(String, nullable=False, default="user")  # user, agent, system
+    type = Column(MessageType, nullable=False, default="user")
     content = Column(Text, nullable=False)
-    meta_data = Column(JSON, nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    meta_data = Column(JSONDocument, nullable=True)
+    timestamp = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
+    
+    __table_args__ = (
+        # Latest agent message of a trip (options lookup, prompt checks)
+        Index("ix_messages_trip_type_ts", "trip_id", "type", "timestamp"),
+        # Chat history of a trip in timestamp order
+        Index("ix_messages_trip_ts", "trip_id", "timestamp"),
+        # Keyset pagination of the chat history (WHERE id < cursor ORDER BY id DESC)
+        Index("ix_messages_trip_id_id", "trip_id", "id"),
+        # Filters on meta_data->>'type' (trip_options, prompts, ...)
+        Index("ix_messages_meta_type", meta_data["type"].as_string()),
+        # Containment queries (meta_data @> '{"type": ...}')
+        Index("ix_messages_meta_gin", meta_data, postgresql_using="gin",
+              postgresql_ops={"meta_data": "jsonb_path_ops"}).ddl_if(dialect="postgresql"),
+        # Partial index for the "prompt already sent?" checks; only prompt rows qualify
+        Index("ix_prompt_exists", "trip_id",
+              postgresql_where=(type == "agent") & meta_data["type"].as_string().in_(
+                  ["generate_options_prompt", "detailed_plan_prompt"])),
+    )
     
     # Relationships
     trip = relationship("Trip", back_populates="messages")
@@ -81,7 +147,7 @@ class UserPreferences(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
-    trip_id = Column(String, ForeignKey("trips.trip_id"), nullable=False)
+    trip_id = Column(String, ForeignKey("trips.trip_id"), nullable=False, index=True)
     budget_preference = Column(String, nullable=True)  # low, medium, high
     accommodation_type = Column(String, nullable=True)  # hotel, hostel, airbnb
     travel_style = Column(String, nullable=True)  # adventure, cultural, relaxing
@@ -89,7 +155,7 @@ class UserPreferences(Base):
     dietary_restrictions = Column(String, nullable=True)
     special_requirements = Column(Text, nullable=True)
     raw_preferences = Column(JSON, nullable=True)  # array of raw preference messages
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
     
     # Relationships
     user = relationship("User", back_populates="preferences")
@@ -103,6 +169,11 @@ class DateAvailability(Base):
     date = Column(DateTime, nullable=False)
     available = Column(Boolean, nullable=False, default=True)
     
+    __table_args__ = (
+        # One row per user per date; the availability endpoints upsert on it
+        UniqueConstraint("trip_id", "user_id", "date", name="uq_avail"),
+    )
+    
     # Relationships
     trip = relationship("Trip", back_populates="availability")
     user = relationship("User", back_populates="availability")
@@ -113,9 +184,16 @@ class Vote(Base):
     id = Column(Integer, primary_key=True, index=True)
     trip_id = Column(String, ForeignKey("trips.trip_id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Id of an option inside the trip's latest trip_options message meta_data
+    # ("option_1", ...), scoped by trip_id; not a trip_options row
     option_id = Column(String, nullable=False)
     emoji = Column(String, nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_votes_trip_option", "trip_id", "option_id"),
+        Index("ix_votes_trip_user", "trip_id", "user_id"),
+    )
     
     # Relationships
     trip = relationship("Trip", back_populates="votes")
@@ -132,8 +210,12 @@ class TripOption(Base):
     description = Column(Text, nullable=True)
     price = Column(Integer, nullable=True)
     image = Column(String, nullable=True)
-    meta_data = Column(JSON, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    meta_data = Column(JSONDocument, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_options_trip_type", "trip_id", "type"),
+    )
     
     # Relationships
     trip = relationship("Trip", back_populates="options")
\ No newline at end of file
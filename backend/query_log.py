@@ -0,0 +1,90 @@
+"""Development-only SQL query log with a simple N+1 detector.
+
+Every query executed while an HTTP request is being handled is recorded
+against that request. When the response is done a one-line summary is
+printed, followed by any SQL shape that ran at least ``threshold`` times:
+
+    DEBUG: GET /api/trips/X/participants -> 12 queries in 4.1ms
+    DEBUG:   N+1 suspect: 10x SELECT users.id, ... FROM users WHERE users.id = ?
+"""
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+# (statement, duration_ns) for each query of the current request. The list is
+# shared by reference, so queries run from threadpool copies of the context
+# still land in it.
+_request_queries: ContextVar[Optional[list]] = ContextVar("request_queries",
+                                                          default=None)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_BIND = re.compile(r"%\(\w+\)s|:\w+|\$\d+|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape so repeated lookups group together."""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _BIND.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _PLACEHOLDER_LIST.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def install(engine):
+    """Attach the timing hooks to ``engine``."""
+
+    # The start time lives on the per-statement execution context, so a
+    # statement that raises (and never reaches after_cursor_execute) leaves
+    # nothing behind on the pooled connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                               executemany):
+        context._query_log_start = time.perf_counter_ns()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                              executemany):
+        started = context._query_log_start
+        queries = _request_queries.get()
+        if queries is not None:
+            queries.append((statement, time.perf_counter_ns() - started))
+
+
+class QueryLogMiddleware:
+    """ASGI middleware that prints the per-request query summary."""
+
+    def __init__(self, app, threshold: int = 5):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries: list = []
+        token = _request_queries.set(queries)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_queries.reset(token)
+            if queries:
+                self._report(scope, queries)
+
+    def _report(self, scope, queries: list):
+        total_ms = sum(duration for _, duration in queries) / 1e6
+        print(f"DEBUG: {scope['method']} {scope['path']} -> "
+              f"{len(queries)} queries in {total_ms:.1f}ms")
+
+        shapes = Counter(normalize_sql(statement) for statement, _ in queries)
+        for shape, count in shapes.most_common():
+            if count < self.threshold:
+                break
+            print(f"DEBUG:   N+1 suspect: {count}x {shape[:200]}")
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Responses worth another try: rate limits and transient upstream failures.
+# A 5xx from a gateway can mean the upstream did (or is still doing) the
+# work, so expensive non-idempotent calls should pass RATE_LIMIT_STATUSES.
+RETRY_STATUSES = {429, 502, 503, 504}
+RATE_LIMIT_STATUSES = {429}
+
+# Failures before the request reached the upstream, so retrying is safe even
+# for non-idempotent calls. Read timeouts and dropped connections
+# (RemoteProtocolError) are not retried: the request was already sent and the
+# upstream may still be working on it.
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Delay requested by a Retry-After header (seconds or HTTP date), if any."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+async def post_with_retry(client: httpx.AsyncClient, url: str, *,
+                          attempts: int = 5, initial_delay: float = 1.0,
+                          max_delay: float = 30.0,
+                          retry_statuses: set = RETRY_STATUSES,
+                          **kwargs) -> httpx.Response:
+    """POST with exponential backoff and jitter on connection errors and
+    ``retry_statuses``, honoring Retry-After. The last response is returned
+    as is, so callers keep their own status handling."""
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        # Jittered so clients that failed together do not retry in lockstep
+        delay = initial_delay * 2 ** attempt * random.uniform(0.5, 1.0)
+        try:
+            response = await client.post(url, **kwargs)
+        except RETRY_ERRORS as e:
+            if last_attempt:
+                raise
+            logger.warning("POST %s failed (%r), retrying", url, e)
+        else:
+            if response.status_code not in retry_statuses or last_attempt:
+                return response
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                delay = retry_after
+            logger.warning("POST %s returned %d, retrying", url, response.status_code)
+        await asyncio.sleep(min(delay, max_delay))
@@ -1,6 +1,14 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from datetime import datetime
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Literal
+
+from .models import TripState, ParticipantRole, MessageType
+
+# Same value domains as the enum columns, so out-of-domain input is rejected
+# with a 422 instead of failing on the database constraint
+TripStateValue = Literal[tuple(TripState.enums)]
+ParticipantRoleValue = Literal[tuple(ParticipantRole.enums)]
+MessageTypeValue = Literal[tuple(MessageType.enums)]
 
 # User schemas
 class UserBase(BaseModel):
@@ -16,8 +24,7 @@ class UserCreate(UserBase):
 class User(UserBase):
     id: int
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # User preferences schemas
 class UserPreferencesBase(BaseModel):
@@ -38,8 +45,7 @@ class UserPreferences(UserPreferencesBase):
     trip_id: str
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Trip schemas
 class TripBase(BaseModel):
@@ -49,7 +55,7 @@ class TripBase(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     budget: Optional[int] = None
-    state: Optional[str] = "INIT"
+    state: Optional[TripStateValue] = "INIT"
 
 class TripCreate(TripBase):
     pass
@@ -60,28 +66,26 @@ class Trip(TripBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Participant schemas
 class TripParticipant(BaseModel):
     id: int
     trip_id: str
     user_id: int
-    role: str
+    role: ParticipantRoleValue
     is_online: bool
     joined_at: datetime
     has_submitted_preferences: bool
     has_submitted_availability: bool
     user: Optional[User] = None
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Message schemas
 class MessageBase(BaseModel):
     content: str
-    type: Optional[str] = "user"
+    type: Optional[MessageTypeValue] = "user"
     metadata: Optional[Any] = Field(None, alias="meta_data")
 
 class MessageCreate(MessageBase):
@@ -93,9 +97,7 @@ class Message(MessageBase):
     user_id: Optional[int]
     timestamp: datetime
     
-    class Config:
-        from_attributes = True
-        populate_by_name = True
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 # Vote schemas
 class VoteBase(BaseModel):
@@ -111,8 +113,7 @@ class Vote(VoteBase):
     user_id: int
     timestamp: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Trip Option schemas
 class TripOptionBase(BaseModel):
@@ -132,8 +133,7 @@ class TripOption(TripOptionBase):
     trip_id: str
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Date Availability schemas
 class DateAvailabilityBase(BaseModel):
@@ -152,11 +152,16 @@ class DateAvailability(DateAvailabilityBase):
     trip_id: str
     user_id: int
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # WebSocket message schemas
 class WebSocketMessage(BaseModel):
     type: str
     data: Optional[Any] = None
-    timestamp: Optional[datetime] = None
\ No newline at end of file
+    timestamp: Optional[datetime] = None
+
+# Adapters for list responses: one compiled validator/serializer per list type
+MessageListAdapter = TypeAdapter(List[Message])
+VoteListAdapter = TypeAdapter(List[Vote])
+ParticipantListAdapter = TypeAdapter(List[TripParticipant])
+DateAvailabilityListAdapter = TypeAdapter(List[DateAvailability])
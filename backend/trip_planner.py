@@ -1,9 +1,13 @@
+import asyncio
+import base64
+import hashlib
 import json
 import os
-import requests
+import httpx
 import traceback
 from datetime import datetime, date
-from typing import List, Optional
+from pathlib import Path
+from typing import AsyncIterator, List, NamedTuple, Optional, Set
 from textwrap import dedent
 from dotenv import load_dotenv
 load_dotenv()
@@ -11,15 +15,16 @@ load_dotenv()
 from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 
-from .models import Trip, Message, UserPreferences, User
+from .models import Message, UserPreferences, User
+from .cache import TTLCache, load_trip
+from .retry import post_with_retry
 
 # OpenAI integration
-import openai
-from openai import OpenAI
-import os
+from openai import AsyncOpenAI
+from openai.lib._pydantic import to_strict_json_schema
 
 # Initialize OpenAI client
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+openai_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
 
 
@@ -28,7 +33,25 @@ url = "https://api.getimg.ai/v1/flux-schnell/text-to-image"
 BEARER_KEY = os.environ.get("GETIMG_API_KEY")
 
 
-def generate_image(
+class ImageClient(NamedTuple):
+    """Pooled getimg.ai connections and the cap on calls in flight.
+
+    Both belong to the event loop that creates them, so the app makes one in
+    its lifespan rather than at import time.
+    """
+    http: httpx.AsyncClient
+    semaphore: asyncio.Semaphore
+
+    @classmethod
+    def create(cls, max_in_flight: int = 3) -> "ImageClient":
+        return cls(httpx.AsyncClient(timeout=60.0), asyncio.Semaphore(max_in_flight))
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+async def generate_image(
+    images: ImageClient,
     image_prompt: str,
     height: int = 512,
     width: int = 1024,
@@ -50,15 +73,43 @@ def generate_image(
         "authorization": f"Bearer {BEARER_KEY}"
     }
 
+    async with images.semaphore:
+        response = await post_with_retry(images.http, url, json=payload, headers=headers)
     try:
-        response = requests.post(url, json=payload, headers=headers)
         image = response.json()["image"]
     except Exception as e:
-        print(f"Error generating image: {e}", response.json())
+        print(f"Error generating image: {e}", response.text)
         raise e
 
     return image
 
+# Generated images are stored as files named by a hash of the request and
+# served from /images, so messages carry a short URL instead of the base64
+# payload and a repeated prompt reuses the file instead of calling getimg.ai.
+IMAGE_DIR = Path(os.environ.get("IMAGE_DIR", "generated_images"))
+
+
+def image_cache_key(image_prompt: str, height: int = 512, width: int = 1024, steps: int = 4) -> str:
+    return hashlib.sha256(
+        json.dumps([image_prompt, height, width, steps]).encode()).hexdigest()
+
+
+def save_image(image_b64: str, name: str):
+    path = IMAGE_DIR / name
+    IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_bytes(base64.b64decode(image_b64))
+    tmp_path.replace(path)
+
+
+async def generate_image_url(images: ImageClient, image_prompt: str) -> str:
+    name = f"{image_cache_key(image_prompt)}.jpg"
+    if not (IMAGE_DIR / name).exists():
+        image_b64 = await generate_image(images, image_prompt)
+        await asyncio.to_thread(save_image, image_b64, name)
+    return f"/images/{name}"
+
+
 class Activity(BaseModel):
     name: str
     description: str
@@ -91,111 +142,38 @@ class ProposedPlans(BaseModel):
     plans: List[PreliminaryPlan]
 
 
-async def generate_trip_options_internal(trip_id: str, consensus_dates: list, db: Session, manager):
-    """Internal function to generate trip options when consensus is reached."""
-    try:
-        print(f"DEBUG: Generating trip options for trip {trip_id}")
-        # Get trip details
-        trip = db.query(Trip).filter(Trip.trip_id == trip_id).first()
-        if not trip:
-            return
+# PreliminaryPlan fields kept in an option's meta_data["structured_plan"]
+STRUCTURED_PLAN_FIELDS = {"duration_days", "start_date", "end_date", "day_plans"}
 
 
-        # Add pending status message
-        pending_message = Message(
-            trip_id=trip_id,
-            user_id=None,
-            type="agent",
-            content="🔍 Looking for the best trip options based on your preferences... This may take a moment!",
-            meta_data={"type": "status_pending", "status": "generating_options"}
-        )
-        db.add(pending_message)
-        db.commit()
-        db.refresh(pending_message)
+# Generated plans keyed by everything that goes into the prompt. Reruns for the
+# same destination, dates and preferences reuse the plans instead of paying for
+# another multi-second completion. Bump the schema tag when the prompt or
+# ProposedPlans change.
+# The options are a first draft the group votes on and the winner's detailed
+# plan comes from the Trip Planner API, so a smaller model is enough here.
+PLANS_MODEL = os.environ.get("PLANS_MODEL", "gpt-4o-mini")
+PLANS_SCHEMA = "ProposedPlans.v1"
+PLANS_CACHE_TTL = 7 * 24 * 3600
+_plans_cache = TTLCache(maxsize=256)
 
-        # Broadcast pending status
-        await manager.broadcast_to_trip(
-            trip_id, {
-                "type": "new_message", 
-                "message": {
-                    "id": pending_message.id,
-                    "trip_id": pending_message.trip_id,
-                    "user_id": pending_message.user_id,
-                    "type": pending_message.type,
-                    "content": pending_message.content,
-                    "timestamp": pending_message.timestamp.isoformat(),
-                    "metadata": pending_message.meta_data
-                },
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
-        
-        # Store pending message ID for later deletion
-        pending_message_id = pending_message.id
-
-        # ------------------------------------------------------------------
-        # Hide previous prompt messages with the button (if they still exist)
-        # ------------------------------------------------------------------
-
-        prompt_messages = db.query(Message).filter(
-            Message.trip_id == trip_id,
-            Message.type == "agent",
-            Message.meta_data.isnot(None)
-        ).all()
-
-        for msg in prompt_messages:
-            if isinstance(msg.meta_data, dict) and msg.meta_data.get("type") == "generate_options_prompt":
-                prompt_id = msg.id
-                db.delete(msg)
-                db.commit()
-
-                # Broadcast deletion so clients remove the message
-                await manager.broadcast_to_trip(
-                    trip_id,
-                    {
-                        "type": "message_deleted",
-                        "message_id": prompt_id,
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
-                )
 
-        print(f"DEBUG: Starting AI generation for trip {trip_id}")
+def plans_cache_key(context: dict) -> str:
+    payload = {
+        "model": PLANS_MODEL,
+        "schema": PLANS_SCHEMA,
+        "destination": context["destination"],
+        "consensus_dates": sorted(context["consensus_dates"]),
+        "grouped_preferences": sorted(
+            context["grouped_preferences"], key=lambda p: p["user_id"]),
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
 
-        # Get user preferences for context including raw preferences
-        preferences = db.query(UserPreferences).filter(
-            UserPreferences.trip_id == trip_id).all()
-
-        # Get user information for preference grouping
-        users = db.query(User).filter(
-            User.id.in_([pref.user_id for pref in preferences])
-        ).all()
-        user_dict = {user.id: user for user in users}
-
-        # Group preferences by user for better conflict resolution
-        grouped_preferences = []
-        for pref in preferences:
-            user = user_dict.get(pref.user_id)
-            user_prefs = {
-                "user_id": pref.user_id,
-                "user_name": user.display_name if user else f"User {pref.user_id}",
-                "raw_preferences": pref.raw_preferences or []  # list of str with preferences about trip duration, attractions, etc
-            }
-            grouped_preferences.append(user_prefs)
-
-        # Build context for AI including grouped preferences and conflict analysis
-        context = {
-            "destination": trip.destination or "Barcelona",
-            "budget": trip.budget,
-            "consensus_dates": consensus_dates,  # list of dates in YYYY-MM-DD format
-            "grouped_preferences": grouped_preferences,
-        }
 
-        # Generate personalized trip options using AI with structured output
-        response = openai_client.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=[{
-                "role": "system",
-                "content": """You are TripSync AI, a travel planning expert specializing in group dynamics and conflict resolution. Generate 3 distinct trip itinerary options that address group preferences, resolve conflicts, and find common ground.
+# Kept byte-identical across calls (no interpolation) so OpenAI's prompt
+# caching can reuse it; everything trip-specific goes in the user message.
+PLANS_SYSTEM_PROMPT = """You are TripSync AI, a travel planning expert specializing in group dynamics and conflict resolution. Generate 3 distinct trip itinerary options that address group preferences, resolve conflicts, and find common ground.
 
 Your strategy:
 1. ANALYZE CONFLICTS: Identify where group members have different preferences
@@ -217,9 +195,75 @@ For each plan:
 - Include specific restaurants, attractions, experiences
 - Vary the duration (3-7 days) based on group preferences
 - Ensure activities match the travel style and budget"""
-            }, {
-                "role": "user",
-                "content": f"""Generate 3 trip options for {context['destination']} with a focus on group dynamics and conflict resolution:
+
+
+# Strict JSON schema for ProposedPlans, derived once instead of by the SDK on
+# every request. Passing the plain dict means the stream no longer parses the
+# content for us; _stream_plans picks the finished plans out itself.
+PLANS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "ProposedPlans",
+        "schema": to_strict_json_schema(ProposedPlans),
+        "strict": True,
+    },
+}
+
+
+class _PlanScanner:
+    """Finds the finished plans in the streamed {"plans": [...]} document.
+
+    Only the text added since the last call is scanned, tracking nesting depth
+    and string state, so the whole response is read once rather than re-parsed
+    on every delta.
+    """
+    PLAN_DEPTH = 3  # root object > plans array > plan object
+
+    def __init__(self):
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._plan_start = 0
+
+    def feed(self, snapshot: str) -> List[str]:
+        """JSON text of each plan completed since the previous call."""
+        plans = []
+        for i in range(self._pos, len(snapshot)):
+            ch = snapshot[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "{" and self._depth == self.PLAN_DEPTH:
+                    self._plan_start = i
+            elif ch in "}]":
+                if ch == "}" and self._depth == self.PLAN_DEPTH:
+                    plans.append(snapshot[self._plan_start:i + 1])
+                self._depth -= 1
+        self._pos = len(snapshot)
+        return plans
+
+
+async def _stream_plans(context: dict) -> AsyncIterator[PreliminaryPlan]:
+    """Yield each itinerary option as soon as the model has finished writing it."""
+    emitted = 0
+    scanner = _PlanScanner()
+    async with openai_client.beta.chat.completions.stream(
+        model=PLANS_MODEL,
+        messages=[{
+            "role": "system",
+            "content": PLANS_SYSTEM_PROMPT
+        }, {
+            "role": "user",
+            "content": f"""Generate 3 trip options for {context['destination']} with a focus on group dynamics and conflict resolution:
 
 TRIP DETAILS:
 - Destination: {context['destination']}
@@ -235,40 +279,231 @@ STRATEGY: Create 3 options that each take a different approach to resolving conf
 3. Option 3: SEGMENTED SATISFACTION - different parts of trip satisfy different users and duration preferences
 
 Each option should explain HOW it addresses the group's specific conflicts and ensures everyone gets something they want."""
-            }],
-            response_format=ProposedPlans,
-            max_tokens=3000,
-            temperature=0.7
+        }],
+        response_format=PLANS_RESPONSE_FORMAT,
+        max_tokens=3000,
+        temperature=0.7
+    ) as stream:
+        async for event in stream:
+            if event.type != "content.delta":
+                continue
+            for plan_json in scanner.feed(event.snapshot):
+                yield PreliminaryPlan.model_validate_json(plan_json)
+                emitted += 1
+        completion = await stream.get_final_completion()
+
+    content = completion.choices[0].message.content
+    if content:
+        for plan in ProposedPlans.model_validate_json(content).plans[emitted:]:
+            yield plan
+
+
+async def _cached_plans(raw: str) -> AsyncIterator[PreliminaryPlan]:
+    for plan in ProposedPlans.model_validate_json(raw).plans:
+        yield plan
+
+
+# Blocking DB work of the options flow. Each helper runs in a worker thread
+# via asyncio.to_thread so the event loop keeps serving sockets meanwhile.
+
+def _message_payload(message: Message) -> dict:
+    return {
+        "id": message.id,
+        "trip_id": message.trip_id,
+        "user_id": message.user_id,
+        "type": message.type,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat(),
+        "metadata": message.meta_data
+    }
+
+
+def _add_pending_message(db: Session, trip_id: str) -> dict:
+    pending_message = Message(
+        trip_id=trip_id,
+        user_id=None,
+        type="agent",
+        content="🔍 Looking for the best trip options based on your preferences... This may take a moment!",
+        meta_data={"type": "status_pending", "status": "generating_options"}
+    )
+    db.add(pending_message)
+    db.commit()
+    db.refresh(pending_message)
+    return _message_payload(pending_message)
+
+
+def _delete_options_prompts(db: Session, trip_id: str) -> List[int]:
+    prompt_ids = [row.id for row in db.query(Message.id).filter(
+        Message.trip_id == trip_id,
+        Message.type == "agent",
+        Message.meta_data["type"].as_string() == "generate_options_prompt"
+    )]
+    if prompt_ids:
+        db.query(Message).filter(Message.id.in_(prompt_ids)).delete(synchronize_session=False)
+        db.commit()
+    return prompt_ids
+
+
+def _build_context(db: Session, trip_id: str, consensus_dates: list) -> dict:
+    trip = load_trip(db, trip_id)
+
+    # Get user preferences with their users' names for preference grouping
+    rows = db.query(UserPreferences, User.display_name).outerjoin(
+        User, User.id == UserPreferences.user_id
+    ).filter(UserPreferences.trip_id == trip_id).all()
+
+    # Group preferences by user for better conflict resolution
+    grouped_preferences = []
+    for pref, display_name in rows:
+        user_prefs = {
+            "user_id": pref.user_id,
+            "user_name": display_name or f"User {pref.user_id}",
+            "raw_preferences": pref.raw_preferences or []  # list of str with preferences about trip duration, attractions, etc
+        }
+        grouped_preferences.append(user_prefs)
+
+    # Build context for AI including grouped preferences and conflict analysis
+    return {
+        "destination": trip.destination or "Barcelona",
+        "budget": trip.budget,
+        "consensus_dates": consensus_dates,  # list of dates in YYYY-MM-DD format
+        "grouped_preferences": grouped_preferences,
+    }
+
+
+def _save_options_message(db: Session, trip_id: str, pending_message_id: int,
+                          content: str, meta_data: dict) -> Optional[dict]:
+    # The pending message becomes the options message. Re-read it: a trip
+    # reset during the generation deletes it, and then there is nothing to
+    # fill in (None).
+    db_message = db.get(Message, pending_message_id, populate_existing=True)
+    if db_message is None:
+        return None
+    db_message.content = content
+    db_message.meta_data = meta_data
+
+    # Update trip state
+    load_trip(db, trip_id).state = "VOTING_HIGH_LEVEL"
+    db.commit()
+
+    db.refresh(db_message)
+    return _message_payload(db_message)
+
+
+# Trips with an options generation in flight in this process
+_generating_trips: Set[str] = set()
+
+
+async def generate_trip_options_internal(trip_id: str, consensus_dates: list, db: Session, manager,
+                                         images: ImageClient):
+    """Internal function to generate trip options when consensus is reached."""
+    # Two triggers for the same trip can both pass the prompt checks; only the
+    # first one pays for a generation, the other returns right away
+    if trip_id in _generating_trips:
+        print(f"DEBUG: Trip options already being generated for trip {trip_id}")
+        return
+
+    _generating_trips.add(trip_id)
+    try:
+        await _generate_trip_options(trip_id, consensus_dates, db, manager, images)
+    finally:
+        _generating_trips.discard(trip_id)
+
+
+async def _generate_trip_options(trip_id: str, consensus_dates: list, db: Session, manager,
+                                 images: ImageClient):
+    try:
+        print(f"DEBUG: Generating trip options for trip {trip_id}")
+        # Get trip details
+        trip = await asyncio.to_thread(load_trip, db, trip_id)
+        if not trip:
+            return
+
+        # Add pending status message
+        pending_message = await asyncio.to_thread(_add_pending_message, db, trip_id)
+
+        # Broadcast pending status
+        await manager.broadcast_to_trip(
+            trip_id, {
+                "type": "new_message", 
+                "message": pending_message,
+                "timestamp": datetime.utcnow().isoformat()
+            }
         )
         
-        proposed_plans = response.choices[0].message.parsed
-        
-        if not proposed_plans or not proposed_plans.plans:
+        # Store pending message ID; it is turned into the final message
+        pending_message_id = pending_message["id"]
+
+        # ------------------------------------------------------------------
+        # Hide previous prompt messages with the button (if they still exist)
+        # ------------------------------------------------------------------
+
+        prompt_ids = await asyncio.to_thread(_delete_options_prompts, db, trip_id)
+
+        # Broadcast deletion so clients remove the messages
+        await manager.broadcast_many(trip_id, [{
+            "type": "message_deleted",
+            "message_id": prompt_id,
+            "timestamp": datetime.utcnow().isoformat()
+        } for prompt_id in prompt_ids])
+
+        print(f"DEBUG: Starting AI generation for trip {trip_id}")
+
+        context = await asyncio.to_thread(_build_context, db, trip_id, consensus_dates)
+
+        cache_key = plans_cache_key(context)
+        cached_plans = _plans_cache.get(cache_key)
+        if cached_plans is not None:
+            print(f"DEBUG: Reusing cached trip options for trip {trip_id}")
+            plan_source = _cached_plans(cached_plans)
+        else:
+            plan_source = _stream_plans(context)
+
+        # As each plan completes, start its illustrative image and let clients
+        # know it is ready instead of waiting for the whole completion
+        plans, plan_highlights, image_tasks = [], [], []
+        async for plan in plan_source:
+            # Create highlights from activities of the first 3 days
+            highlights = [day_plan.activities[0].name for day_plan in plan.day_plans[:3] if day_plan.activities]
+            image_prompt = (
+                f"Beautiful travel photo that represents the '{plan.name}' itinerary in {context['destination']}. "
+                f"Key highlights: {', '.join(highlights[:3])}. Vibrant colors, wide angle, cinematic."
+            )
+            plans.append(plan)
+            plan_highlights.append(highlights)
+            image_tasks.append(asyncio.create_task(generate_image_url(images, image_prompt)))
+
+            await manager.broadcast_to_trip(
+                trip_id, {
+                    "type": "partial_option",
+                    "message_id": pending_message_id,
+                    "option_index": len(plans) - 1,
+                    "option": {
+                        "option_id": f"option_{len(plans)}",
+                        "title": plan.name,
+                        "description": plan.summary,
+                    },
+                    "timestamp": datetime.utcnow().isoformat()
+                }
+            )
+
+        if not plans:
             print("ERROR: No plans generated from AI")
             return
 
+        if cached_plans is None:
+            _plans_cache.set(cache_key, ProposedPlans(plans=plans).model_dump_json(), PLANS_CACHE_TTL)
+
+        image_urls = await asyncio.gather(*image_tasks, return_exceptions=True)
+
         # Convert structured plans to legacy format for frontend compatibility
         legacy_options = []
-        for i, plan in enumerate(proposed_plans.plans):
+        for i, (plan, highlights, image_url) in enumerate(zip(plans, plan_highlights, image_urls)):
             # Calculate estimated price per person
             # price_per_person = context['budget'] // len(context['grouped_preferences']) if context['budget'] and len(context['grouped_preferences']) > 0 else 500
-            
-            # Create highlights from activities
-            highlights = []
-            for day_plan in plan.day_plans[:3]:  # Take activities from first 3 days
-                if day_plan.activities:
-                    highlights.append(day_plan.activities[0].name)
-
-            # Generate an illustrative image for the itinerary using the AI image service
-            try:
-                image_prompt = (
-                    f"Beautiful travel photo that represents the '{plan.name}' itinerary in {context['destination']}. "
-                    f"Key highlights: {', '.join(highlights[:3])}. Vibrant colors, wide angle, cinematic."
-                )
-                image_b64 = generate_image(image_prompt)
-                image_url = f"data:image/jpeg;base64,{image_b64}"
-            except Exception as img_err:
-                print(f"Image generation failed for option {i+1}: {img_err}")
+
+            if isinstance(image_url, Exception):
+                print(f"Image generation failed for option {i+1}: {image_url}")
                 # Fallback to placeholder image if generation fails
                 image_url = f"https://images.unsplash.com/photo-{1500000000 + i}?w=400&h=300&fit=crop"
 
@@ -284,26 +519,8 @@ Each option should explain HOW it addresses the group's specific conflicts and e
                     "start_date": plan.start_date.isoformat(),
                     "end_date": plan.end_date.isoformat(),
                     "highlights": highlights,
-                    "structured_plan": {
-                        "duration_days": plan.duration_days,
-                        "start_date": plan.start_date.isoformat(),
-                        "end_date": plan.end_date.isoformat(),
-                        "day_plans": [
-                            {
-                                "activities": [
-                                    {
-                                        "name": activity.name,
-                                        "description": activity.description,
-                                        "location": activity.location,
-                                        "preliminary_length": activity.preliminary_length,
-                                        "cost": activity.cost
-                                    }
-                                    for activity in day_plan.activities
-                                ]
-                            }
-                            for day_plan in plan.day_plans
-                        ]
-                    },
+                    "structured_plan": plan.model_dump(
+                        mode="json", include=STRUCTURED_PLAN_FIELDS),
                     "consensus_dates": consensus_dates
                 }
             }
@@ -314,66 +531,19 @@ Each option should explain HOW it addresses the group's specific conflicts and e
         consensus_message += f", I've generated 3 personalized itinerary options for your {context['destination']} trip."
         consensus_message += "\n\n✨ **Each option addresses your specific interests and preferences!**\n\nVote for your favorite option below!"
 
-        db_message = Message(
-            trip_id=trip_id,
-            user_id=None,
-            type="agent",
-            content=consensus_message,
-            meta_data={
+        message_dict = await asyncio.to_thread(
+            _save_options_message, db, trip_id, pending_message_id, consensus_message, {
                 "type": "trip_options",
                 "options": legacy_options,
                 "consensus_dates": consensus_dates
-            }
-        )
-
-        db.add(db_message)
-
-        # Update trip state
-        trip.state = "VOTING_HIGH_LEVEL"
-        db.commit()
-
-        # Refresh the message to get the ID
-        db.refresh(db_message)
-
-        # Delete the pending message now that we have the real result
-        db.query(Message).filter(Message.id == pending_message_id).delete()
-        db.commit()
-
-        # Broadcast pending message deletion
-        await manager.broadcast_to_trip(
-            trip_id, {
-                "type": "message_deleted",
-                "message_id": pending_message_id,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        )
-
-        # ------------------------------------------------------------------
-        # Broadcast the new message
-        # ------------------------------------------------------------------
-        message_dict = {
-            "content": db_message.content,
-            "type": db_message.type,
-            "metadata": db_message.meta_data,
-            "id": db_message.id,
-            "trip_id": db_message.trip_id,
-            "user_id": db_message.user_id,
-            "timestamp": db_message.timestamp.isoformat()
-        }
-
-        # Use a safe, lightweight debug log to avoid BlockingIOError when the
-        # stdout buffer is saturated (can happen with very large payloads).
-        # try:
-        #     # Only log the top-level keys – the full metadata can be huge.
-        #     print(f"DEBUG: Broadcasting new message (keys={list(message_dict.keys())})")
-        # except BlockingIOError:
-        #     # If the underlying stdout is busy, silently skip the debug log
-        #     # rather than crashing and preventing the broadcast.
-        #     pass
+            })
+        if message_dict is None:
+            print(f"DEBUG: Pending message of trip {trip_id} is gone, dropping its trip options")
+            return
 
         await manager.broadcast_to_trip(
             trip_id, {
-                "type": "new_message",
+                "type": "message_updated",
                 "message": message_dict,
                 "timestamp": datetime.utcnow().isoformat()
             }
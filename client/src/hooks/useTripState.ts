@@ -470,6 +470,33 @@ export function useTripState(tripId: string, userId: number) {
             return oldData.filter((msg: any) => msg.id !== message.message_id);
           });
           break;
+        case "message_updated":
+          // A pending message was turned into its final result; swap it in place
+          queryClient.setQueryData([`/api/trips/${tripId}/messages`], (oldData: any) => {
+            if (!oldData) return oldData;
+            return oldData.map((msg: any) =>
+              msg.id === message.message.id ? message.message : msg,
+            );
+          });
+          // The result also moves the trip to its next state
+          queryClient.invalidateQueries({
+            queryKey: [`/api/trips/${tripId}`],
+          });
+          break;
+        case "partial_option":
+          // Show generation progress on the pending message until the full options arrive
+          queryClient.setQueryData([`/api/trips/${tripId}/messages`], (oldData: any) => {
+            if (!oldData) return oldData;
+            return oldData.map((msg: any) =>
+              msg.id === message.message_id
+                ? {
+                    ...msg,
+                    content: `✨ Option ${message.option_index + 1} is ready: ${message.option?.title}. Finishing the rest...`,
+                  }
+                : msg,
+            );
+          });
+          break;
         case "options_generated":
           queryClient.invalidateQueries({
             queryKey: [`/api/trips/${tripId}/options`],
@@ -35,8 +35,11 @@ export function useWebSocket(tripId: string, userId: number) {
         try {
           const message = JSON.parse(event.data);
           console.log('DEBUG: Received WebSocket message:', message);
+          // The server coalesces related events into a single "multi" frame
+          const received: WebSocketMessage[] =
+            message.type === 'multi' ? message.events : [message];
           setMessages(prev => {
-            const newMessages = [...prev, message];
+            const newMessages = [...prev, ...received];
             console.log(`DEBUG: Total WebSocket messages: ${newMessages.length}`);
             return newMessages;
           });
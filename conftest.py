@@ -0,0 +1,125 @@
+"""
+Shared pytest fixtures for the backend test scripts
+"""
+import asyncio
+import inspect
+import logging
+import os
+
+import orjson
+import pytest
+from dotenv import load_dotenv
+
+# Tests get a throwaway in-memory SQLite DB unless TEST_DATABASE_URL points
+# elsewhere; set before load_dotenv so .env cannot redirect them to the app DB
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL", "sqlite://")
+load_dotenv()
+
+
+# Mock manager output: the batching summary at INFO, every frame at DEBUG.
+# Quiet unless MOCK_MANAGER_LOG asks for more.
+log = logging.getLogger("mock_manager")
+log.setLevel(os.environ.get("MOCK_MANAGER_LOG", "WARNING"))
+
+
+class MockConnectionManager:
+    """Buffers broadcasts and logs them as one frame per flush, the way
+    production coalesces events into a single ``multi`` frame."""
+    MAX_EVENTS = 50
+    MAX_FRAME_BYTES = 64 * 1024
+    FLUSH_INTERVAL = 0.005
+
+    def __init__(self):
+        self._buf = {}  # trip_id -> events waiting for the next frame
+        self._buf_bytes = 0
+        self._flush_task = None
+        self.events_sent = 0
+        self.frames_sent = 0
+
+    async def broadcast_to_trip(self, trip_id, message):
+        size = len(orjson.dumps(message, default=str))
+        if self._buf and self._buf_bytes + size > self.MAX_FRAME_BYTES:
+            self._flush()
+        self._buf.setdefault(trip_id, []).append(message)
+        self._buf_bytes += size
+        if sum(len(events) for events in self._buf.values()) >= self.MAX_EVENTS:
+            self._flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def broadcast_many(self, trip_id, events):
+        for event in events:
+            await self.broadcast_to_trip(trip_id, event)
+
+    def close(self):
+        """Send whatever is still buffered and report the batching ratio.
+
+        Synchronous so fixture teardown can call it after the test's event
+        loop is gone.
+        """
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._flush()
+        log.info("📦 %d broadcasts sent in %d frames", self.events_sent, self.frames_sent)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.FLUSH_INTERVAL)
+        self._flush_task = None
+        self._flush()
+
+    def _flush(self):
+        for trip_id, events in self._buf.items():
+            frame = events[0] if len(events) == 1 else {"type": "multi", "events": events}
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("📡 FRAME to trip %s: %s (%d events)", trip_id, frame['type'], len(events))
+                for event in events:
+                    # One serialized record per event instead of walking every
+                    # option, day and activity
+                    log.debug(orjson.dumps(event, option=orjson.OPT_INDENT_2, default=str).decode())
+            self.events_sent += len(events)
+            self.frames_sent += 1
+        self._buf = {}
+        self._buf_bytes = 0
+
+
+@pytest.fixture
+def manager():
+    """Broadcast sink for the planner tests, flushed after the test."""
+    manager = MockConnectionManager()
+    yield manager
+    manager.close()
+
+
+@pytest.fixture(scope="session")
+def engine_fixture():
+    """Create the schema once per pytest run."""
+    # Imported here so test modules that never touch the DB do not set up
+    # an engine
+    from backend.database import engine, init_db
+    from backend.models import User, Trip, TripParticipant, Message, UserPreferences
+
+    # Only what the planner tests touch, not the whole schema
+    init_db([User.__table__, Trip.__table__, TripParticipant.__table__,
+             Message.__table__, UserPreferences.__table__])
+    yield engine
+
+
+@pytest.fixture(scope="module")
+def db(engine_fixture):
+    """One session shared by all tests in a module."""
+    from backend.database import get_db
+
+    db = next(get_db())
+    yield db
+    db.close()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    # Run `async def` tests on a fresh event loop, no plugin required
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    kwargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**kwargs))
+    return True
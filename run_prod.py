@@ -0,0 +1,21 @@
+import os
+import uvicorn
+
+if __name__ == "__main__":
+    # Set up the environment
+    os.environ["PYTHONPATH"] = "."
+    os.environ.setdefault("NODE_ENV", "production")
+
+    # WebSocket connections, the consensus cache and the in-flight generation
+    # guard live in process memory, so extra workers would not see each
+    # other's sockets. Raise WEB_CONCURRENCY only once that state is shared.
+    # reload is off: it cannot be combined with workers > 1.
+    # uvicorn uses uvloop/httptools automatically when they are installed.
+    uvicorn.run(
+        "backend.main:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", "5001")),
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1")),
+        proxy_headers=True,
+        log_level="info"
+    )
@@ -12,6 +12,8 @@ export const users = pgTable("users", {
   homeCity: text("home_city"),
 });
 
+// Row timestamps are timestamptz and serialized as ISO strings with a UTC
+// offset ("...+00:00"), so new Date() parses them as UTC rather than local time
 export const trips = pgTable("trips", {
   id: serial("id").primaryKey(),
   tripId: text("trip_id").notNull().unique(),
@@ -22,8 +24,8 @@ export const trips = pgTable("trips", {
   budget: integer("budget"),
   state: text("state").notNull().default("INIT"),
   inviteToken: text("invite_token").notNull().unique(),
-  createdAt: timestamp("created_at").defaultNow(),
-  updatedAt: timestamp("updated_at").defaultNow(),
+  createdAt: timestamp("created_at", { withTimezone: true }).defaultNow(),
+  updatedAt: timestamp("updated_at", { withTimezone: true }).defaultNow(),
 });
 
 export const tripParticipants = pgTable("trip_participants", {
@@ -32,7 +34,7 @@ export const tripParticipants = pgTable("trip_participants", {
   userId: integer("user_id").notNull(),
   role: text("role").notNull().default("traveler"),
   isOnline: boolean("is_online").default(false),
-  joinedAt: timestamp("joined_at").defaultNow(),
+  joinedAt: timestamp("joined_at", { withTimezone: true }).defaultNow(),
   hasSubmittedPreferences: boolean("has_submitted_preferences").default(false),
   hasSubmittedAvailability: boolean("has_submitted_availability").default(false),
 });
@@ -44,7 +46,7 @@ export const messages = pgTable("messages", {
   type: text("type").notNull().default("user"), // user, agent, system
   content: text("content").notNull(),
   metadata: jsonb("metadata"),
-  timestamp: timestamp("timestamp").defaultNow(),
+  timestamp: timestamp("timestamp", { withTimezone: true }).defaultNow(),
 });
 
 export const dateAvailability = pgTable("date_availability", {
@@ -61,7 +63,7 @@ export const votes = pgTable("votes", {
   userId: integer("user_id").notNull(),
   optionId: text("option_id").notNull(),
   emoji: text("emoji").notNull(),
-  timestamp: timestamp("timestamp").defaultNow(),
+  timestamp: timestamp("timestamp", { withTimezone: true }).defaultNow(),
 });
 
 export const tripOptions = pgTable("trip_options", {
@@ -74,7 +76,7 @@ export const tripOptions = pgTable("trip_options", {
   price: integer("price"),
   image: text("image"),
   metadata: jsonb("metadata"),
-  createdAt: timestamp("created_at").defaultNow(),
+  createdAt: timestamp("created_at", { withTimezone: true }).defaultNow(),
 });
 
 export const insertUserSchema = createInsertSchema(users).pick({
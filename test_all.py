@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Run the trip options and detailed plan tests concurrently
+"""
+import asyncio
+import logging
+import os
+import sys
+from logging.handlers import MemoryHandler
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from backend.database import get_db, init_db
+import test_detailed_planner as detailed
+import test_trip_planner as planner
+
+
+async def main():
+    init_db(detailed.TABLES + planner.TABLES)
+    detailed_db, planner_db = next(get_db()), next(get_db())
+    try:
+        # Separate trips, users and sessions, so the two runs do not interfere;
+        # both spend most of their time waiting on external APIs
+        await asyncio.gather(
+            detailed.test_generate_detailed_plan(detailed_db, detailed.setup_test_data(detailed_db)),
+            planner.test_generate_trip_options(planner_db, planner.setup_test_data(planner_db)))
+    finally:
+        detailed_db.close()
+        planner_db.close()
+
+if __name__ == "__main__":
+    if not os.environ.get("OPENAI_API_KEY"):
+        print("⚠️  WARNING: OPENAI_API_KEY not set. The trip options test may not work properly.")
+        print()
+
+    # Write the mock managers' log records out in batches
+    logging.getLogger("mock_manager").addHandler(
+        MemoryHandler(1000, target=logging.StreamHandler(sys.stdout)))
+    asyncio.run(main())
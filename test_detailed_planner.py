@@ -3,47 +3,58 @@
 Test script for generate_detailed_trip_plan function
 """
 import asyncio
+import logging
 import sys
 import os
-from datetime import datetime, date, timedelta
-from unittest.mock import patch
+from logging.handlers import MemoryHandler
+from datetime import datetime, date, time, timedelta
 
 import httpx
+import orjson
+import pytest
 from dotenv import load_dotenv
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 load_dotenv()
 
-# Add backend directory to path so local imports work when script is executed directly
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
-from backend.database import get_db, engine
-from backend.models import Base, User, Trip, TripParticipant, Message, UserPreferences
+from backend.database import get_db, init_db
+from backend.models import User, Trip, TripParticipant, Message, UserPreferences
 from backend.detailed_planner import generate_detailed_trip_plan
 
 # --------------------------- Helpers --------------------------- #
 
-class MockConnectionManager:
-    async def broadcast_to_trip(self, trip_id, message):
-        """Simple mock that prints broadcast messages to stdout."""
-        print(f"\n📡 BROADCAST to trip {trip_id}:")
-        print(f"   Type: {message.get('type')}")
-        if message.get('type') == 'new_message':
-            print(f"   New message: {message['message'].get('content', '')[:120]}...")
-        else:
-            print(f"   Payload: {message}")
+# Trip dates are relative to TEST_ANCHOR_DATE (YYYY-MM-DD) when set, for runs
+# that must be reproducible; computed once per process
+_ANCHOR_DATE = date.fromisoformat(os.environ.get("TEST_ANCHOR_DATE") or date.today().isoformat())
+_TRIP_START = datetime.combine(_ANCHOR_DATE, time()) + timedelta(days=40)
+_TRIP_END = _TRIP_START + timedelta(days=3)
+
+# Tables this test reads and writes; init_db creates just these
+TABLES = [User.__table__, Trip.__table__, TripParticipant.__table__,
+          Message.__table__, UserPreferences.__table__]
 
 class DummyAsyncClient:
-    """Stubbed replacement for httpx.AsyncClient used by detailed_planner."""
-    def __init__(self, *args, **kwargs):
-        pass
+    """Stubbed replacement for the httpx.AsyncClient used by detailed_planner.
 
+    One instance is shared by every call, like the app's pooled planner client.
+    """
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
         pass
 
+    @staticmethod
+    def _json_response(payload):
+        # orjson instead of the stdlib encoder httpx uses for json=
+        return httpx.Response(200, content=orjson.dumps(payload),
+                              headers={"content-type": "application/json"})
+
     async def post(self, url, json):
-        """Return a fake successful response with a minimal itinerary payload."""
+        """Return a fake successful response for either planner endpoint."""
+        if url.endswith("/get_hotels_and_flights"):
+            return self._json_response({"hotels_plan": {}, "flights_plan": {}})
+
         itinerary = {
             "name": "Sample Itinerary",
             "city_plans": [
@@ -55,75 +66,72 @@ class DummyAsyncClient:
                 }
             ]
         }
-        return httpx.Response(200, json={
+        return self._json_response({
             "conversation_id": json["conversation_id"],
             "message": "Success",
             "timestamp": datetime.utcnow().isoformat(),
             "itinerary": itinerary
         })
 
+_DUMMY = DummyAsyncClient()
+
 # --------------------------- Test Setup --------------------------- #
 
-async def setup_test_data():
+def setup_test_data(db):
     """Populate the DB with a minimal trip and user preference data set."""
-    Base.metadata.create_all(bind=engine)
+    # Clean previous remnants (nothing is loaded yet, so skip the identity-map sync)
+    for model in (Message, UserPreferences, TripParticipant, Trip):
+        db.query(model).filter(model.trip_id == "test_trip_456").delete(synchronize_session=False)
 
-    db = next(get_db())
-
-    # Clean previous remnants
-    db.query(Message).filter(Message.trip_id == "test_trip_456").delete()
-    db.query(UserPreferences).filter(UserPreferences.trip_id == "test_trip_456").delete()
-    db.query(TripParticipant).filter(TripParticipant.trip_id == "test_trip_456").delete()
-    db.query(Trip).filter(Trip.trip_id == "test_trip_456").delete()
-
-    # Users
-    user = db.query(User).filter(User.id == 1).first()
-    if not user:
-        user = User(id=1, username="tester", display_name="Tester", password="", color="#F59E0B")
-        db.add(user)
+    # Users (kept as is if they already exist). Preferences are unique per
+    # user, so this test has its own user and can run alongside test_trip_planner
+    dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    db.execute(dialect_insert(User).values(
+        id=4, username="tester", display_name="Tester", password="", color="#F59E0B"
+    ).on_conflict_do_nothing())
 
     # Trip
-    trip_start = datetime.utcnow() + timedelta(days=40)
-    trip_end = trip_start + timedelta(days=3)
-
     trip = Trip(
         trip_id="test_trip_456",
         title="Barcelona Culture Escape",
         destination="Barcelona",
-        start_date=trip_start,
-        end_date=trip_end,
+        start_date=_TRIP_START,
+        end_date=_TRIP_END,
         budget=1200,
         invite_token="test_token_456",
-        state="OPTIONS_VOTING"
+        state="VOTING_HIGH_LEVEL"
     )
     db.add(trip)
 
-    # Participant
-    participant = TripParticipant(trip_id="test_trip_456", user_id=1, role="organizer")
-    db.add(participant)
-
-    # Preferences
-    pref = UserPreferences(
-        trip_id="test_trip_456",
-        user_id=1,
-        budget_preference="mid-range",
-        accommodation_type="hotel",
-        travel_style="cultural",
-        activities=["museums", "architecture"],
-        raw_preferences=["Love Gaudí buildings", "Interested in Picasso Museum"]
-    )
-    db.add(pref)
+    # The bulk inserts below bypass the unit of work; write the trip first
+    db.flush()
+
+    # Participant and preferences as plain mappings, no ORM objects
+    db.bulk_insert_mappings(TripParticipant, [
+        {"trip_id": "test_trip_456", "user_id": 4, "role": "organizer"}])
+    db.bulk_insert_mappings(UserPreferences, [{
+        "trip_id": "test_trip_456",
+        "user_id": 4,
+        "budget_preference": "mid-range",
+        "accommodation_type": "hotel",
+        "travel_style": "cultural",
+        "activities": ["museums", "architecture"],
+        "raw_preferences": ["Love Gaudí buildings", "Interested in Picasso Museum"]
+    }])
 
     db.commit()
-    db.close()
 
     return "test_trip_456"
 
+@pytest.fixture
+def trip_fixture(db):
+    return setup_test_data(db)
+
 # --------------------------- Main Test --------------------------- #
 
-async def test_generate_detailed_plan():
+async def test_generate_detailed_plan(db, trip_fixture, manager):
     print("🧪 Testing generate_detailed_trip_plan function\n")
-    trip_id = await setup_test_data()
+    trip_id = trip_fixture
 
     # Winning option stub (only title & description used in detailed_planner)
     winning_option = {
@@ -131,36 +139,37 @@ async def test_generate_detailed_plan():
         "description": "A balanced mix of top cultural spots and amazing food experiences."
     }
 
-    manager = MockConnectionManager()
-    db = next(get_db())
+    print("🚀 Calling generate_detailed_trip_plan...")
+    await generate_detailed_trip_plan(trip_id, winning_option, db, manager, client=_DUMMY)
 
+    # Verify detailed plan message exists
+    message = db.query(Message).filter(
+        Message.trip_id == trip_id,
+        Message.type == "detailed_plan"
+    ).first()
+
+    if message:
+        print("✅ SUCCESS: Detailed plan message created!")
+        print(f"   Content: {message.content[:120]}...")
+    else:
+        print("❌ FAILED: No detailed plan message found")
+    assert message is not None
+
+async def main():
+    from conftest import MockConnectionManager
+
+    init_db(TABLES)
+    db = next(get_db())
+    manager = MockConnectionManager()
     try:
-        await generate_detailed_trip_plan(trip_id, winning_option, db, manager)
-    except Exception as e:
-        raise e
-        print(e)
-
-    # # Patch AsyncClient inside detailed_planner with our dummy stub
-    # with patch("backend.detailed_planner.httpx.AsyncClient", DummyAsyncClient):
-    #     try:
-    #         print("🚀 Calling generate_detailed_trip_plan...")
-    #         await generate_detailed_trip_plan(trip_id, winning_option, db, manager)
-
-    #         # Verify detailed plan message exists
-    #         message = db.query(Message).filter(
-    #             Message.trip_id == trip_id,
-    #             Message.type == "detailed_plan"
-    #         ).first()
-
-    #         if message:
-    #             print("✅ SUCCESS: Detailed plan message created!")
-    #             print(f"   Content: {message.content[:120]}...")
-    #         else:
-    #             print("❌ FAILED: No detailed plan message found")
+        await test_generate_detailed_plan(db, setup_test_data(db), manager)
     finally:
-         db.close()
+        manager.close()
+        db.close()
 
 if __name__ == "__main__":
     # Ensure external API URL is set to avoid accidental live calls
     os.environ.setdefault("EXTERNAL_API_BASE_URL", "http://dummy-api" )
-    asyncio.run(test_generate_detailed_plan()) 
\ No newline at end of file
+    # Write log records out in batches rather than one write per line
+    logging.getLogger("mock_manager").addHandler(MemoryHandler(1000, target=logging.StreamHandler(sys.stdout)))
+    asyncio.run(main()) 
\ No newline at end of file
@@ -1,10 +1,15 @@
 from backend.ai_agent import AIAgent
 import asyncio
+import os
 from datetime import datetime
+import pytest
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Calls the real OpenAI API. The suite needs OPENAI_API_KEY set just to import
+# the backend, so running it is opt-in rather than keyed on that.
+@pytest.mark.skipif(not os.environ.get("OPENAI_LIVE_TESTS"), reason="OPENAI_LIVE_TESTS not set")
 async def test_date_extraction():
     agent = AIAgent()
     
@@ -17,13 +22,34 @@ async def test_date_extraction():
         'I prefer budget accommodations'
     ]
     
-    for msg in test_messages:
+    # Each call is an OpenAI round-trip; run them concurrently, at most 5 in
+    # flight. Rate-limited (429) calls are retried by the SDK with jittered
+    # exponential backoff, honoring Retry-After.
+    agent.client = agent.client.with_options(max_retries=5)
+    semaphore = asyncio.Semaphore(5)
+
+    async def bounded(msg):
+        async with semaphore:
+            return await agent._detect_intent(msg)
+
+    intents = await asyncio.gather(*[bounded(msg) for msg in test_messages])
+
+    for msg, intent in zip(test_messages, intents):
         print(f'Testing: \"{msg}\"')
-        intent = await agent._detect_intent(msg)
         print(f'  Intent: {intent.intent}')
         print(f'  Month: {intent.extracted_month}')
         print(f'  Year: {intent.extracted_year}')
         print(f'  Date mentions: {intent.date_mentions}')
         print()
 
-asyncio.run(test_date_extraction())
\ No newline at end of file
+    assert [intent.intent for intent in intents[:4]] == ["calendar"] * 4
+    assert [intent.extracted_month for intent in intents[:4]] == [9, 7, 10, 12]
+    assert intents[4].intent == "preferences"
+
+    # Same phrase up to case and whitespace: answered from the intent cache
+    repeat = await agent._detect_intent("  let's go in SEPTEMBER")
+    print(f'Cache hit for repeated phrase: {repeat is intents[0]}')
+    assert repeat is intents[0]
+
+if __name__ == "__main__":
+    asyncio.run(test_date_extraction())
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Test the shared in-flight lookup of the geocode proxy
+"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+from backend import main
+
+
+async def test_leader_cancel_does_not_fail_followers():
+    release = asyncio.Event()
+    upstream_calls = []
+
+    async def nominatim(request):
+        upstream_calls.append(request)
+        await release.wait()
+        return httpx.Response(200, json=[{"lat": "41.39", "lon": "2.17", "display_name": "Barcelona"}])
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(nominatim)) as client:
+        request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(http=client)))
+        main._geocode_cache.pop("barcelona")
+
+        leader = asyncio.create_task(main.geocode_location("Barcelona", request))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(main.geocode_location(" barcelona", request))
+        await asyncio.sleep(0)
+
+        # The first caller disconnects while the lookup is still running
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        result = await follower
+        assert leader.cancelled()
+        assert result == {"lat": 41.39, "lon": 2.17, "display_name": "Barcelona"}
+        assert len(upstream_calls) == 1
+        assert "barcelona" not in main._geocode_inflight
+
+
+if __name__ == "__main__":
+    asyncio.run(test_leader_cancel_does_not_fail_followers())
+    print("✅ SUCCESS: follower got the result after the leader was cancelled")
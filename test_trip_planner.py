@@ -3,92 +3,133 @@
 Test script for generate_trip_options_internal function
 """
 import asyncio
+import base64
+import logging
 import sys
 import os
+import tempfile
+from logging.handlers import MemoryHandler
 from datetime import datetime, date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
 from dotenv import load_dotenv
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 load_dotenv()
 
-# Add backend directory to path
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
-from backend.database import get_db, engine
-from backend.models import Base, User, Trip, TripParticipant, Message, UserPreferences
-from backend.trip_planner import generate_trip_options_internal
-import json
-
-# Mock connection manager for testing
-class MockConnectionManager:
-    async def broadcast_to_trip(self, trip_id, message):
-        print(f"📡 BROADCAST to trip {trip_id}:")
-        print(f"   Type: {message.get('type')}")
-        print(f"   Message: {message.get('message', {}).get('content', 'N/A')[:100]}...")
-        if message.get('message', {}).get('metadata'):
-            options = message['message']['metadata'].get('options', [])
-            print(f"   Generated {len(options)} trip options")
-            
-            # Print structured plan details
-            for i, option in enumerate(options, 1):
-                meta = option.get('meta_data', {})
-                structured = meta.get('structured_plan', {})
-                print(f"   Option {i}: {option.get('title', 'N/A')}")
-                print(f"     Duration: {structured.get('duration_days', 'N/A')} days")
-                print(f"     Dates: {structured.get('start_date', 'N/A')} to {structured.get('end_date', 'N/A')}")
-                if structured.get('day_plans'):
-                    print(f"     Activities: {len(structured['day_plans'])} days planned")
-                    for day_idx, day_plan in enumerate(structured['day_plans'][:2], 1):
-                        activities = day_plan.get('activities', [])
-                        print(f"       Day {day_idx}: {len(activities)} activities")
-                        for act in activities[:2]:
-                            print(f"         - {act.get('name', 'N/A')}")
-        print()
-
-async def setup_test_data():
+from backend.database import get_db, init_db
+from backend.models import User, Trip, TripParticipant, Message, UserPreferences
+from backend import trip_planner
+from backend.trip_planner import generate_trip_options_internal, ImageClient
+import orjson
+
+# Dates are relative to TEST_ANCHOR_DATE (YYYY-MM-DD) when set, for runs
+# that must be reproducible; computed once per process
+_ANCHOR_DATE = date.fromisoformat(os.environ.get("TEST_ANCHOR_DATE") or date.today().isoformat())
+# 7 consecutive available dates, starting 30 days from the anchor
+_CONSENSUS_DATES = tuple((_ANCHOR_DATE + timedelta(days=30 + i)).isoformat() for i in range(7))
+
+# Tables this test reads and writes; init_db creates just these
+TABLES = [User.__table__, Trip.__table__, TripParticipant.__table__,
+          Message.__table__, UserPreferences.__table__]
+
+class DummyPlansStream:
+    """Stands in for the OpenAI chat completion stream of the options flow.
+
+    Replays a canned ProposedPlans document as growing snapshots, a few
+    characters at a time, the way content.delta events arrive.
+    """
+    CHUNK = 40
+
+    def __init__(self, content):
+        self._content = content
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    async def __aiter__(self):
+        for end in range(self.CHUNK, len(self._content) + self.CHUNK, self.CHUNK):
+            yield SimpleNamespace(type="content.delta", snapshot=self._content[:end])
+
+    async def get_final_completion(self):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self._content))])
+
+
+class DummyOpenAI:
+    """Stubbed replacement for trip_planner.openai_client."""
+    def __init__(self):
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=self))
+
+    def stream(self, **kwargs):
+        plans = [{
+            "duration_days": 3,
+            "start_date": _CONSENSUS_DATES[i],
+            "end_date": _CONSENSUS_DATES[i + 2],
+            "name": f"Barcelona Option {i + 1}",
+            "summary": "Gaudí, tapas and the beach.",
+            "day_plans": [{"activities": [{
+                "name": f"Sagrada Família {day + 1}",
+                "description": "Guided visit",
+                "location": "Eixample",
+                "preliminary_length": "2 hours",
+                "cost": 30,
+            }]} for day in range(3)],
+        } for i in range(3)]
+        return DummyPlansStream(orjson.dumps({"plans": plans}).decode())
+
+
+async def _dummy_generate_image(images, image_prompt, **kwargs):
+    return base64.b64encode(b"jpeg").decode()
+
+# Preference rows of the three test travellers, inserted as plain mappings
+_PREFERENCES = (
+    {
+        "user_id": 1,
+        "budget_preference": "mid-range",
+        "accommodation_type": "hotel",
+        "travel_style": "cultural",
+        "activities": ["museums", "walking tours", "local food"],
+        "raw_preferences": ["I love art museums and want to see Gaudí architecture", "Prefer staying in city center"]
+    },
+    {
+        "user_id": 2,
+        "budget_preference": "budget",
+        "accommodation_type": "hostel",
+        "travel_style": "adventure",
+        "activities": ["nightlife", "beaches", "outdoor activities"],
+        "raw_preferences": ["Want to experience Barcelona nightlife", "Beach time is essential"]
+    },
+    {
+        "user_id": 3,
+        "budget_preference": "luxury",
+        "accommodation_type": "hotel",
+        "travel_style": "relaxed",
+        "activities": ["fine dining", "spas", "shopping"],
+        "raw_preferences": ["Looking for great restaurants", "Want some relaxation time"]
+    },
+)
+
+def setup_test_data(db):
     """Set up test data in database"""
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
-    
-    db = next(get_db())
-    
-    # Clean up any existing test data
-    db.query(Message).filter(Message.trip_id == "test_trip_123").delete()
-    db.query(UserPreferences).filter(UserPreferences.trip_id == "test_trip_123").delete()
-    db.query(TripParticipant).filter(TripParticipant.trip_id == "test_trip_123").delete()
-    db.query(Trip).filter(Trip.trip_id == "test_trip_123").delete()
-    
-    # Create test users if they don't exist
-    user1 = db.query(User).filter(User.id == 1).first()
-    if not user1:
-        user1 = User(
-            id=1,
-            username="alice",
-            display_name="Alice",
-            password="",
-            color="#3B82F6"
-        )
-        db.add(user1)
-    
-    user2 = db.query(User).filter(User.id == 2).first()
-    if not user2:
-        user2 = User(
-            id=2,
-            username="bob",
-            display_name="Bob", 
-            password="",
-            color="#10B981"
-        )
-        db.add(user2)
-    
-    user3 = db.query(User).filter(User.id == 3).first()
-    if not user3:
-        user3 = User(
-            id=3,
-            username="carol",
-            display_name="Carol",
-            password="",
-            color="#8B5CF6"
-        )
-        db.add(user3)
+    # Clean up any existing test data (nothing is loaded yet, so skip the
+    # identity-map sync)
+    for model in (Message, UserPreferences, TripParticipant, Trip):
+        db.query(model).filter(model.trip_id == "test_trip_123").delete(synchronize_session=False)
+    # Preferences are unique per user; drop any left behind by other test trips
+    db.query(UserPreferences).filter(UserPreferences.user_id.in_([1, 2, 3])).delete(synchronize_session=False)
+    
+    # Create test users if they don't exist, in one INSERT ... ON CONFLICT DO NOTHING
+    dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    db.execute(dialect_insert(User).values([
+        {"id": 1, "username": "alice", "display_name": "Alice", "password": "", "color": "#3B82F6"},
+        {"id": 2, "username": "bob", "display_name": "Bob", "password": "", "color": "#10B981"},
+        {"id": 3, "username": "carol", "display_name": "Carol", "password": "", "color": "#8B5CF6"}
+    ]).on_conflict_do_nothing())
     
     # Create test trip
     test_trip = Trip(
@@ -97,148 +138,89 @@ async def setup_test_data():
         destination="Barcelona",
         budget=1500,
         invite_token="test_token_123",
-        state="COLLECTING_AVAILABILITY"
+        state="COLLECTING_DATES"
     )
     db.add(test_trip)
     
-    # Create participants
-    participants = [
-        TripParticipant(trip_id="test_trip_123", user_id=1, role="organizer"),
-        TripParticipant(trip_id="test_trip_123", user_id=2, role="traveler"),
-        TripParticipant(trip_id="test_trip_123", user_id=3, role="traveler")
-    ]
-    
-    for participant in participants:
-        db.add(participant)
-    
-    # Create test preferences
-    preferences = [
-        UserPreferences(
-            trip_id="test_trip_123",
-            user_id=1,
-            budget_preference="mid-range",
-            accommodation_type="hotel",
-            travel_style="cultural",
-            activities=["museums", "walking tours", "local food"],
-            raw_preferences=["I love art museums and want to see Gaudí architecture", "Prefer staying in city center"]
-        ),
-        UserPreferences(
-            trip_id="test_trip_123", 
-            user_id=2,
-            budget_preference="budget",
-            accommodation_type="hostel",
-            travel_style="adventure",
-            activities=["nightlife", "beaches", "outdoor activities"],
-            raw_preferences=["Want to experience Barcelona nightlife", "Beach time is essential"]
-        ),
-        UserPreferences(
-            trip_id="test_trip_123",
-            user_id=3,
-            budget_preference="luxury",
-            accommodation_type="hotel",
-            travel_style="relaxed",
-            activities=["fine dining", "spas", "shopping"],
-            raw_preferences=["Looking for great restaurants", "Want some relaxation time"]
-        )
-    ]
+    # The bulk inserts below bypass the unit of work; write the trip first
+    db.flush()
+
+    # Create participants in one executemany INSERT
+    db.bulk_insert_mappings(TripParticipant, [
+        {"trip_id": "test_trip_123", "user_id": 1, "role": "organizer"},
+        {"trip_id": "test_trip_123", "user_id": 2, "role": "traveler"},
+        {"trip_id": "test_trip_123", "user_id": 3, "role": "traveler"}
+    ])
     
-    for pref in preferences:
-        db.add(pref)
+    # Create test preferences in one executemany INSERT
+    db.bulk_insert_mappings(UserPreferences, [
+        {"trip_id": "test_trip_123", **row} for row in _PREFERENCES])
     
     db.commit()
-    db.close()
     
     print("✅ Test data setup complete!")
     return "test_trip_123"
 
+@pytest.fixture
+def trip_fixture(db):
+    return setup_test_data(db)
+
 def generate_consensus_dates():
     """Generate some test consensus dates"""
-    start_date = date.today() + timedelta(days=30)  # 30 days from now
-    dates = []
-    
-    for i in range(7):  # 7 consecutive available dates
-        test_date = start_date + timedelta(days=i)
-        dates.append(test_date.isoformat())
-    
+    dates = list(_CONSENSUS_DATES)
     print(f"📅 Generated consensus dates: {dates}")
     return dates
 
-async def test_generate_trip_options():
+async def test_generate_trip_options(db, trip_fixture, manager):
     """Main test function"""
     print("🧪 Testing generate_trip_options_internal function\n")
     
-    # Setup test data
-    trip_id = await setup_test_data()
+    trip_id = trip_fixture
     consensus_dates = generate_consensus_dates()
     
-    # Create mock manager
-    manager = MockConnectionManager()
-    
-    # Get database session
+    images = ImageClient.create()
+    
+    # No OpenAI or getimg.ai calls; generated images go to a throwaway dir
+    with tempfile.TemporaryDirectory() as image_dir, \
+            patch.object(trip_planner, "openai_client", DummyOpenAI()), \
+            patch.object(trip_planner, "generate_image", _dummy_generate_image), \
+            patch.object(trip_planner, "IMAGE_DIR", Path(image_dir)):
+        try:
+            print("🚀 Calling generate_trip_options_internal...")
+            await generate_trip_options_internal(trip_id, consensus_dates, db, manager, images)
+        finally:
+            await images.aclose()
+
+    # Check if message was created (served by ix_messages_trip_type_ts and
+    # ix_messages_meta_type; a leading-wildcard LIKE on content cannot use an index)
+    message = db.query(Message).filter(
+        Message.trip_id == trip_id,
+        Message.type == "agent",
+        Message.meta_data["type"].as_string() == "trip_options"
+    ).first()
+    assert message is not None, "No trip options message found"
+
+    options = message.meta_data["options"]
+    print("✅ SUCCESS: Trip options message created!")
+    print(f"   Content: {message.content[:100]}...")
+    print(f"   Generated {len(options)} options")
+    for i, option in enumerate(options, 1):
+        print(f"   📋 Option {i}: {option.get('title')} (€{option.get('price', 0)})")
+    assert len(options) == 3
+
+async def main():
+    from conftest import MockConnectionManager
+
+    init_db(TABLES)
     db = next(get_db())
-    
+    manager = MockConnectionManager()
     try:
-        print("🚀 Calling generate_trip_options_internal...")
-        await generate_trip_options_internal(trip_id, consensus_dates, db, manager)
-        
-        # Check if message was created
-        message = db.query(Message).filter(
-            Message.trip_id == trip_id,
-            Message.type == "agent",
-            Message.content.like("%Consensus Reached%")
-        ).first()
-        
-        if message:
-            print("✅ SUCCESS: Trip options message created!")
-            print(f"   Content: {message.content[:100]}...")
-            
-            if message.meta_data and message.meta_data.get('options'):
-                options = message.meta_data['options']
-                print(f"   Generated {len(options)} options")
-                
-                # Print summary of each option
-                for i, option in enumerate(options, 1):
-                    print(f"\n   📋 Option {i}: {option.get('title')}")
-                    print(f"      Price: €{option.get('price', 0)}")
-                    
-                    meta = option.get('meta_data', {})
-                    structured = meta.get('structured_plan', {})
-                    
-                    if structured:
-                        print(f"      Duration: {structured.get('duration_days')} days")
-                        print(f"      Dates: {structured.get('start_date')} to {structured.get('end_date')}")
-                        
-                        day_plans = structured.get('day_plans', [])
-                        total_activities = sum(len(day.get('activities', [])) for day in day_plans)
-                        print(f"      Total Activities: {total_activities}")
-                        
-                        # Show first few activities
-                        if day_plans:
-                            print(f"      Sample Activities:")
-                            for day_idx, day_plan in enumerate(day_plans[:2], 1):
-                                activities = day_plan.get('activities', [])
-                                for act_idx, activity in enumerate(activities[:2], 1):
-                                    print(f"        Day {day_idx}.{act_idx}: {activity.get('name')}")
-                                    print(f"          Location: {activity.get('location')}")
-                                    if activity.get('preliminary_length'):
-                                        print(f"          Duration: {activity.get('preliminary_length')}")
-            else:
-                print("❌ No options found in message metadata")
-        else:
-            print("❌ FAILED: No trip options message found")
-            
-    except Exception as e:
-        print(f"❌ ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        await test_generate_trip_options(db, setup_test_data(db), manager)
     finally:
+        manager.close()
         db.close()
 
 if __name__ == "__main__":
-    # Check if OpenAI API key is set
-    if not os.environ.get("OPENAI_API_KEY"):
-        print("⚠️  WARNING: OPENAI_API_KEY not set. The function may not work properly.")
-        print("   Set it with: export OPENAI_API_KEY='your-api-key'")
-        print()
-    
-    asyncio.run(test_generate_trip_options()) 
\ No newline at end of file
+    # Write log records out in batches rather than one write per line
+    logging.getLogger("mock_manager").addHandler(MemoryHandler(1000, target=logging.StreamHandler(sys.stdout)))
+    asyncio.run(main()) 
\ No newline at end of file